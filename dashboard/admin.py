@@ -1,31 +1,123 @@
 from django.contrib.gis import admin
-from .models import Occurrence, Species, Dataset, Area
+from django.db import transaction
 
+from .models import (
+    Occurrence,
+    Species,
+    Dataset,
+    Area,
+    ReferenceDataLoad,
+    refresh_area_derived_tables,
+    updating_occurrence_derived_tables,
+)
+from .views.tileserver import hexagon_aggregates_sizes
+
+
+class DataVersionAdminMixin:
+    """Record each change made in the admin, so the cached data (tiles, ...) is invalidated (see
+    cache.current_data_version())"""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        ReferenceDataLoad.record(ReferenceDataLoad.ADMIN_EDITS)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ReferenceDataLoad.record(ReferenceDataLoad.ADMIN_EDITS)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        ReferenceDataLoad.record(ReferenceDataLoad.ADMIN_EDITS)
+
+
+class OccurrenceAdmin(DataVersionAdminMixin, admin.OSMGeoAdmin):
+    """The hexagon aggregates and the memberships in areas of the edited occurrences are updated"""
 
-class OccurrenceAdmin(admin.OSMGeoAdmin):
     list_display = ("gbif_id", "species", "source_dataset")
     list_filter = ("source_dataset__name", "species__name")
 
+    def save_model(self, request, obj, form, change):
+        # obj.pk is only set after the save for a new occurrence
+        with updating_occurrence_derived_tables(
+            lambda: [obj.pk], hexagon_aggregates_sizes()
+        ):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        occurrence_ids = [obj.pk]
+        with updating_occurrence_derived_tables(
+            lambda: occurrence_ids, hexagon_aggregates_sizes()
+        ):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        occurrence_ids = list(queryset.values_list("pk", flat=True))
+        with updating_occurrence_derived_tables(
+            lambda: occurrence_ids, hexagon_aggregates_sizes()
+        ):
+            super().delete_queryset(request, queryset)
+
 
 admin.site.register(Occurrence, OccurrenceAdmin)
 
 
-class DatasetAdmin(admin.ModelAdmin):
-    pass
+class OccurrencesCascadeAdminMixin:
+    """For the models whose deletion cascades to occurrences (datasets, species): the occurrences are deleted first,
+    updating their derived tables (see OccurrenceAdmin)"""
+
+    def _delete_occurrences(self, objs) -> None:
+        occurrences = Occurrence.objects.filter(
+            **{f"{self.occurrences_field}__in": objs}
+        )
+        occurrence_ids = list(occurrences.values_list("pk", flat=True))
+        with updating_occurrence_derived_tables(
+            lambda: occurrence_ids, hexagon_aggregates_sizes()
+        ):
+            occurrences.delete()
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            self._delete_occurrences([obj])
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            self._delete_occurrences(queryset)
+            super().delete_queryset(request, queryset)
+
+
+# Renaming a dataset or a species doesn't change the derived tables (they reference them by id)
+class DatasetAdmin(
+    OccurrencesCascadeAdminMixin, DataVersionAdminMixin, admin.ModelAdmin
+):
+    occurrences_field = "source_dataset"
 
 
 admin.site.register(Dataset, DatasetAdmin)
 
 
-class SpeciesAdmin(admin.ModelAdmin):
-    pass
+class SpeciesAdmin(
+    OccurrencesCascadeAdminMixin, DataVersionAdminMixin, admin.ModelAdmin
+):
+    occurrences_field = "species"
 
 
 admin.site.register(Species, SpeciesAdmin)
 
 
 class AreaAdmin(admin.OSMGeoAdmin):
-    pass
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        refresh_area_derived_tables([obj.pk])
+
+    # The derived tables of the deleted areas are deleted in cascade
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ReferenceDataLoad.record(ReferenceDataLoad.AREAS)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        ReferenceDataLoad.record(ReferenceDataLoad.AREAS)
 
 
 admin.site.register(Area, AreaAdmin)
@@ -0,0 +1,143 @@
+"""Caching of the API responses, with keys that change as soon as the data served by the application changes
+
+Responses are cached gzipped (compressed once per render, not per hit) with a strong ETag, see precompressed_response().
+"""
+import gzip
+import hashlib
+from functools import wraps
+from typing import Optional, Tuple, Callable
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified, QueryDict
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
+from dashboard.models import DataImport, ReferenceDataLoad
+
+DATA_VERSION_CACHE_KEY = "dashboard-data-version"
+# The data version is recomputed at most every DATA_VERSION_CACHE_DURATION seconds (per process)
+DATA_VERSION_CACHE_DURATION = 10
+
+RESPONSE_CACHE_KEY_PREFIX = "dashboard-response"
+
+GZIP_COMPRESSION_LEVEL = 6
+
+
+def filters_key(params: QueryDict) -> str:
+    """Normalize the parameters of a request, so equivalent requests share the same cache entry (or stored tile).
+
+    Parameters are sorted, as are the values of multi-valued parameters. Empty (or "null") values are ignored."""
+    parts = []
+    for name in sorted(params.keys()):
+        values = sorted(v for v in params.getlist(name) if v not in ("", "null"))
+        if values:
+            parts.append(f"{name}={','.join(values)}")
+    return "&".join(parts)
+
+
+def current_data_version() -> str:
+    """A short token that changes each time the data changes (occurrences import, reference data load, ...)"""
+    version = cache.get(DATA_VERSION_CACHE_KEY)
+    if version is None:
+        latest_import = (
+            DataImport.objects.exclude(end=None)
+            .order_by("-end")
+            .values("pk", "end")
+            .first()
+        )
+        latest_loads = (
+            ReferenceDataLoad.objects.values("kind")
+            .annotate(latest=Max("end"))
+            .order_by("kind")
+        )
+
+        version_parts = [str(latest_import)] + [str(load) for load in latest_loads]
+        version = hashlib.sha1("|".join(version_parts).encode()).hexdigest()[:12]
+        cache.set(DATA_VERSION_CACHE_KEY, version, DATA_VERSION_CACHE_DURATION)
+    return version
+
+
+def compress(content: bytes) -> Tuple[bytes, str]:
+    """Return the gzipped content, and the ETag (without quotes) of the content"""
+    return (
+        gzip.compress(content, compresslevel=GZIP_COMPRESSION_LEVEL, mtime=0),
+        hashlib.sha1(content).hexdigest(),
+    )
+
+
+def precompressed_response(
+    request: HttpRequest, gzipped_content: bytes, content_type: str, etag: str
+) -> HttpResponse:
+    """Build the response for gzipped content (see compress()).
+
+    - 304 (Not Modified) if the client already has this version of the content (If-None-Match)
+    - the gzipped content if the client accepts it, otherwise the decompressed content
+    Both representations have their own strong ETag.
+    """
+    accepts_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+    response_etag = f'"{etag}-gzip"' if accepts_gzip else f'"{etag}"'
+
+    if response_etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        response = HttpResponseNotModified()
+    elif accepts_gzip:
+        response = HttpResponse(gzipped_content, content_type=content_type)
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(
+            gzip.decompress(gzipped_content), content_type=content_type
+        )
+
+    response["ETag"] = response_etag
+    patch_vary_headers(response, ("Accept-Encoding",))
+    # URLs don't change with the data: clients may keep the content, but must revalidate it (cheap, thanks to the ETag)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def cache_per_data_version(
+    timeout: Optional[int] = None,
+    normalize_params: Optional[Callable[[QueryDict], QueryDict]] = None,
+):
+    """Decorator for read-only views: cache the response until the data changes (or timeout seconds, if set)
+
+    Similar to cache_page, but the key contains the data version and the (normalized) request parameters. Responses
+    are cached gzipped, and served with an ETag (see precompressed_response()).
+
+    normalize_params (optional) maps the request parameters to those used in the key, for views that give the same
+    response for different parameter values."""
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request: HttpRequest, *args, **kwargs):
+            # Same logic as views.helpers._get_querydict_from_request
+            if request.method == "GET":
+                params = request.GET
+            else:
+                params = QueryDict(query_string=request.body)
+            if normalize_params is not None:
+                params = normalize_params(params)
+
+            key = ":".join(
+                [
+                    RESPONSE_CACHE_KEY_PREFIX,
+                    current_data_version(),
+                    request.path,
+                    filters_key(params),
+                ]
+            )
+            cached = cache.get(key)
+            if cached is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                gzipped_content, etag = compress(response.content)
+                cached = (gzipped_content, response["Content-Type"], etag)
+                cache.set(key, cached, timeout)
+
+            gzipped_content, content_type, etag = cached
+            return precompressed_response(request, gzipped_content, content_type, etag)
+
+        return wrapped_view
+
+    return decorator
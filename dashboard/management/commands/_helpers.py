@@ -1,11 +1,290 @@
+import csv
+import io
+import json
+import os
+import resource
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import lru_cache
+from typing import List, Iterator, Tuple, Optional, Union, Dict, Callable, Iterable
+from xml.etree import ElementTree
 
 import requests
+from django.conf import settings
+from dwca.read import DwCAReader
+
+from dashboard.models import Dataset
+
+DWC_TEXT_NAMESPACE = "{http://rs.tdwg.org/dwc/text/}"
+
+
+def fetch_json(url: str) -> Dict:
+    """Default HTTP client of DatasetNamesCache"""
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+class DatasetNamesCache:
+    """Persistent (JSON file) cache of GBIF dataset titles, entries expire after ttl seconds.
+
+    fetch_json is the HTTP client: it takes an URL and returns the decoded JSON response. It can be replaced, for
+    example by a stub of the GBIF API for tests (api_url can also point to a local server).
+    The other parameters default to the GBIF_DATASET_NAMES_CACHE_* and GBIF_API_* settings.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[int] = None,
+        fetch_json: Callable[[str], Dict] = fetch_json,
+        api_url: Optional[str] = None,
+        max_concurrent_requests: Optional[int] = None,
+    ):
+        # Settings are read here, not at import time (they can be overridden, e.g. in tests)
+        self.path = path if path is not None else settings.GBIF_DATASET_NAMES_CACHE_PATH
+        self.ttl = ttl if ttl is not None else settings.GBIF_DATASET_NAMES_CACHE_TTL
+        self.fetch_json = fetch_json
+        self.api_url = api_url if api_url is not None else settings.GBIF_API_URL
+        self.max_concurrent_requests = (
+            max_concurrent_requests
+            if max_concurrent_requests is not None
+            else settings.GBIF_API_MAX_CONCURRENT_REQUESTS
+        )
+        # key -> {"name": ..., "fetched_at": ...}
+        self._entries: Dict[str, Dict] = self._load()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _fresh_name(self, gbif_dataset_key: str) -> Optional[str]:
+        entry = self._entries.get(gbif_dataset_key)
+        if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+            return entry["name"]
+        return None
+
+    def _fetch(self, gbif_dataset_key: str) -> None:
+        try:
+            dataset_details = self.fetch_json(
+                f"{self.api_url}/dataset/{gbif_dataset_key}"
+            )
+            name = dataset_details["title"]
+        except (requests.RequestException, KeyError, ValueError):
+            # Not cached: fetched again next time
+            return
+        with self._lock:
+            self._entries[gbif_dataset_key] = {"name": name, "fetched_at": time.time()}
+
+    def _save(self) -> None:
+        # Entries saved by other processes since we loaded the file are kept (the most recently fetched name wins)
+        for key, entry in self._load().items():
+            if key not in self._entries or (
+                entry["fetched_at"] > self._entries[key]["fetched_at"]
+            ):
+                self._entries[key] = entry
+
+        # Write then rename, so concurrent processes never read a partial file
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, gbif_dataset_key: str) -> str:
+        return self.resolve([gbif_dataset_key])[gbif_dataset_key]
+
+    def resolve(self, gbif_dataset_keys: Iterable[str]) -> Dict[str, str]:
+        """Return the names of those datasets. Unknown (or expired) ones are fetched concurrently.
+
+        If fetching a name fails, its previous (expired) name is returned, or an empty string if it's unknown."""
+        gbif_dataset_keys = set(gbif_dataset_keys)
+        missing_keys = [k for k in gbif_dataset_keys if self._fresh_name(k) is None]
+
+        if missing_keys:
+            with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as pool:
+                list(pool.map(self._fetch, missing_keys))
+            self._save()
+
+        return {
+            k: self._entries[k]["name"] if k in self._entries else ""
+            for k in gbif_dataset_keys
+        }
 
 
 @lru_cache(maxsize=None)
-def get_dataset_name_from_gbif_api(gbif_dataset_key: str) -> str:
-    query_url = f"https://api.gbif.org/v1/dataset/{gbif_dataset_key}"
+def default_dataset_names_cache() -> DatasetNamesCache:
+    return DatasetNamesCache()
+
+
+def fill_empty_dataset_names(
+    dataset_names_cache: Optional[DatasetNamesCache] = None,
+) -> int:
+    """Set the name of all datasets that have an empty one (from GBIF), return the number of fixed datasets.
+
+    Necessary because of the following GBIF bug: https://github.com/riparias/early-warning-webapp/issues/41
+    """
+    if dataset_names_cache is None:
+        dataset_names_cache = default_dataset_names_cache()
+
+    datasets = list(Dataset.objects.filter(name=""))
+    names = dataset_names_cache.resolve(dataset.gbif_id for dataset in datasets)
+    # Names that couldn't be fetched are still empty
+    fixed_datasets = [dataset for dataset in datasets if names[dataset.gbif_id]]
+    for dataset in fixed_datasets:
+        dataset.name = names[dataset.gbif_id]
+    Dataset.objects.bulk_update(fixed_datasets, ["name"])
+
+    return len(fixed_datasets)
+
+
+class PhaseTimer:
+    """Accumulate the (wall-clock) duration of the different phases of a process, in seconds"""
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+
+    def add(self, phase_name: str, duration: float) -> None:
+        self.durations[phase_name] = self.durations.get(phase_name, 0.0) + duration
+
+    @contextmanager
+    def phase(self, phase_name: str) -> Iterator[None]:
+        """Context manager: time the enclosed block as (part of) phase_name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase_name, time.perf_counter() - start)
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size (in kB) of this process and of its (terminated) child processes"""
+    return max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+def _strip_line_ending(line: str) -> str:
+    """Remove the LF or CRLF ending of a line (but not a lone CR: it's part of the last field)"""
+    if line.endswith("\r\n"):
+        return line[:-2]
+    if line.endswith("\n"):
+        return line[:-1]
+    return line
+
+
+class StreamingDwCAReader:
+    """A minimal, streaming alternative to DwCAReader (core file only), to be used as a context manager.
+
+    The core data file is decompressed on the fly, straight from the zip file (nothing is extracted to disk), and rows
+    are returned as plain tuples with only the requested terms (see iter_rows()), so memory usage doesn't depend on the
+    archive size.
+    Like DwCAReader, the (EML) metadata is available in the metadata attribute.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.metadata: Optional[ElementTree.Element] = None
+        self._zipfile: Optional[zipfile.ZipFile] = None
+        self._core: Optional[ElementTree.Element] = None
+
+    def __enter__(self) -> "StreamingDwCAReader":
+        self._zipfile = zipfile.ZipFile(self.path)
+        archive = ElementTree.fromstring(self._zipfile.read("meta.xml"))
+        self._core = archive.find(f"{DWC_TEXT_NAMESPACE}core")
+
+        metadata_filename = archive.get("metadata")
+        if metadata_filename:
+            self.metadata = ElementTree.fromstring(
+                self._zipfile.read(metadata_filename)
+            )
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._zipfile.close()
+
+    def _core_attribute(self, name: str, default: str) -> str:
+        # Separators are escaped in meta.xml (for example: "\t")
+        return self._core.get(name, default).encode("utf-8").decode("unicode_escape")
+
+    def iter_rows(self, terms: List[str]) -> Iterator[Tuple[str, ...]]:
+        """Iterate over the core rows, each row being a tuple with the values of those (fully qualified) terms
+
+        Terms that are absent from the archive are returned as empty strings.
+        """
+        # For each requested term: (column index or None, default value)
+        columns = {}
+        for field in self._core.iter(f"{DWC_TEXT_NAMESPACE}field"):
+            index = field.get("index")
+            columns[field.get("term")] = (
+                int(index) if index is not None else None,
+                field.get("default", ""),
+            )
+        columns_for_terms = [columns.get(term, (None, "")) for term in terms]
+
+        core_filename = self._core.find(
+            f"{DWC_TEXT_NAMESPACE}files/{DWC_TEXT_NAMESPACE}location"
+        ).text
+        fields_terminated_by = self._core_attribute("fieldsTerminatedBy", ",")
+        fields_enclosed_by = self._core_attribute("fieldsEnclosedBy", '"')
+        ignore_header_lines = int(self._core.get("ignoreHeaderLines", "0"))
+
+        with self._zipfile.open(core_filename) as raw_file:
+            encoding = self._core.get("encoding", "utf-8")
+            if fields_enclosed_by:
+                lines = csv.reader(
+                    io.TextIOWrapper(raw_file, encoding=encoding, newline=""),
+                    delimiter=fields_terminated_by,
+                    quotechar=fields_enclosed_by,
+                )
+            else:  # Fast path (GBIF downloads): no quoting, a simple split is enough
+                # Lines end with LF (or CRLF) only: a lone CR is part of a field
+                lines = (
+                    _strip_line_ending(line).split(fields_terminated_by)
+                    for line in io.TextIOWrapper(
+                        raw_file, encoding=encoding, newline="\n"
+                    )
+                )
+
+            for i, line in enumerate(lines):
+                # Blank lines: [] from csv.reader, [""] from the fast path
+                if i < ignore_header_lines or not line or line == [""]:
+                    continue
+
+                try:
+                    row = tuple(
+                        line[index] or default if index is not None else default
+                        for index, default in columns_for_terms
+                    )
+                except IndexError:
+                    line_number = lines.line_num if fields_enclosed_by else i + 1
+                    raise ValueError(
+                        f"{core_filename}, line {line_number}: truncated row ({len(line)} fields)"
+                    ) from None
+                yield row
+
+
+def iter_rows_values(
+    dwca: Union[DwCAReader, StreamingDwCAReader], terms: List[str]
+) -> Iterator[Tuple[str, ...]]:
+    """Iterate over the core rows of an archive (opened by either reader), as tuples of the values of those terms"""
+    if isinstance(dwca, StreamingDwCAReader):
+        return dwca.iter_rows(terms)
+    return (tuple(row.data.get(term, "") for term in terms) for row in dwca)
+
 
-    dataset_details = requests.get(query_url).json()
-    return dataset_details["title"]
+def open_dwca(path: str, streaming: bool) -> Union[DwCAReader, StreamingDwCAReader]:
+    """Open a DwC-A with DwCAReader, or StreamingDwCAReader if streaming is True. Use as a context manager."""
+    if streaming:
+        return StreamingDwCAReader(path)
+    return DwCAReader(path)
@@ -0,0 +1,108 @@
+"""Helpers to (re)load a table "offline" in a staging copy, then swap it with the live table.
+
+The swap only consists of metadata operations (DROP/RENAME), so the live table is locked very briefly and readers keep
+using the previous data until then.
+"""
+from typing import List, Tuple
+
+from django.db import connection, transaction
+
+MAX_IDENTIFIER_LENGTH = 63  # PostgreSQL default
+STAGING_SUFFIX = "_staging"
+
+
+def staging_name(name: str) -> str:
+    """Name of the staging counterpart of a table/index/constraint"""
+    return name[: MAX_IDENTIFIER_LENGTH - len(STAGING_SUFFIX)] + STAGING_SUFFIX
+
+
+def _constraints(cursor, table_name: str) -> List[Tuple[str, str]]:
+    """(name, definition) of the constraints of a table"""
+    cursor.execute(
+        """SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f', 'c', 'x')
+        ORDER BY contype DESC""",  # Primary key and unique constraints before foreign keys
+        [table_name],
+    )
+    return cursor.fetchall()
+
+
+def _indexes(cursor, table_name: str) -> List[Tuple[str, bool, str]]:
+    """(name, is_unique, definition) of the indexes of a table, except those backing a constraint"""
+    cursor.execute(
+        """SELECT i.relname, x.indisunique, pg_get_indexdef(i.oid)
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass
+        AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)""",
+        [table_name],
+    )
+    return cursor.fetchall()
+
+
+def create_staging_table(live_table: str, staging_table: str) -> None:
+    """Create an empty copy of live_table: columns, defaults and NOT NULL, but no indexes nor constraints yet"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        cursor.execute(
+            f"CREATE TABLE {staging_table} (LIKE {live_table} INCLUDING DEFAULTS)"
+        )
+
+
+def finalize_staging_table(live_table: str, staging_table: str) -> None:
+    """Build the indexes and constraints of live_table on staging_table (to be called once it is loaded)
+
+    Can be called again (e.g. resumed import) if it failed halfway: what was already built is dropped first."""
+    with connection.cursor() as cursor:
+        for name, _ in _constraints(cursor, staging_table):
+            cursor.execute(f"ALTER TABLE {staging_table} DROP CONSTRAINT {name}")
+        for name, _, _ in _indexes(cursor, staging_table):
+            cursor.execute(f"DROP INDEX {name}")
+
+        for name, is_unique, definition in _indexes(cursor, live_table):
+            using = definition.split(" USING ", 1)[1]
+            cursor.execute(
+                f"CREATE {'UNIQUE ' if is_unique else ''}INDEX {staging_name(name)} "
+                f"ON {staging_table} USING {using}"
+            )
+
+        for name, definition in _constraints(cursor, live_table):
+            cursor.execute(
+                f"ALTER TABLE {staging_table} ADD CONSTRAINT {staging_name(name)} {definition}"
+            )
+
+        cursor.execute(f"ANALYZE {staging_table}")
+
+
+def swap_staging_table(live_table: str, staging_table: str) -> None:
+    """Replace live_table by staging_table (previously prepared by finalize_staging_table())
+
+    The old data is dropped, and the indexes/constraints of the staging table get their usual names back.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {live_table} IN ACCESS EXCLUSIVE MODE")
+
+        index_names = [name for name, _, _ in _indexes(cursor, live_table)]
+        constraint_names = [name for name, _ in _constraints(cursor, live_table)]
+
+        # Sequences (serial primary key) are owned by the live table, they would be dropped with it
+        cursor.execute(
+            """SELECT s.relname, a.attname
+            FROM pg_class s
+            JOIN pg_depend d ON d.objid = s.oid
+            JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+            WHERE s.relkind = 'S' AND d.deptype = 'a' AND d.refobjid = %s::regclass""",
+            [live_table],
+        )
+        for sequence_name, column_name in cursor.fetchall():
+            cursor.execute(
+                f"ALTER SEQUENCE {sequence_name} OWNED BY {staging_table}.{column_name}"
+            )
+
+        cursor.execute(f"DROP TABLE {live_table}")
+        cursor.execute(f"ALTER TABLE {staging_table} RENAME TO {live_table}")
+        for name in constraint_names:
+            cursor.execute(
+                f"ALTER TABLE {live_table} RENAME CONSTRAINT {staging_name(name)} TO {name}"
+            )
+        for name in index_names:
+            cursor.execute(f"ALTER INDEX {staging_name(name)} RENAME TO {name}")
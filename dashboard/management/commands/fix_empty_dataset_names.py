@@ -8,17 +8,14 @@
 
 from django.core.management import BaseCommand
 
-from dashboard.management.commands._helpers import get_dataset_name_from_gbif_api
-from dashboard.models import Dataset
+from dashboard.management.commands._helpers import fill_empty_dataset_names
+from dashboard.models import ReferenceDataLoad
 
 
 class Command(BaseCommand):
     def handle(self, *args, **options) -> None:
         self.stdout.write("Will fix every dataset with an empty name...")
-        datasets = Dataset.objects.filter(name="")
-        for dataset in datasets:
-            self.stdout.write(f"dataset key={dataset.gbif_id}...")
-            name = get_dataset_name_from_gbif_api(dataset.gbif_id)
-            self.stdout.write(f"Found name: {name}")
-            dataset.name = name
-            dataset.save()
+        fixed_count = fill_empty_dataset_names()
+        if fixed_count:
+            ReferenceDataLoad.record(ReferenceDataLoad.DATASET_NAMES)
+        self.stdout.write(f"{fixed_count} dataset names fixed")
@@ -1,22 +1,123 @@
 import argparse
+import cProfile
 import datetime
+import io
+import itertools
+import multiprocessing
+import os
 import tempfile
-from typing import List, Dict
+import time
+from collections import deque
+from multiprocessing.pool import AsyncResult
+from typing import (
+    List,
+    Dict,
+    Optional,
+    Any,
+    Tuple,
+    Iterable,
+    Iterator,
+    Deque,
+    Union,
+    Callable,
+)
 
 from django.conf import settings
 from django.contrib.gis.geos import Point
-from django.core.management import BaseCommand, CommandParser
-from django.db import transaction
+from django.core.management import BaseCommand, CommandError, CommandParser
+from django.db import connection, transaction
 from django.utils import timezone
 from dwca.read import DwCAReader
-from dwca.rows import CoreRow
 from dwca.darwincore.utils import qualname as qn
 
 from gbif_blocking_occurrences_download import download_occurrences as download_gbif_occurrences  # type: ignore
 from maintenance_mode.core import set_maintenance_mode
 
-from dashboard.management.commands._helpers import get_dataset_name_from_gbif_api
-from dashboard.models import DataImport, Occurrence, Species, Dataset
+from dashboard.management.commands._helpers import (
+    fill_empty_dataset_names,
+    iter_rows_values,
+    open_dwca,
+    peak_rss_kb,
+    PhaseTimer,
+    StreamingDwCAReader,
+)
+from dashboard.management.commands._table_swap import (
+    staging_name,
+    create_staging_table,
+    finalize_staging_table,
+    swap_staging_table,
+)
+from dashboard.models import (
+    DataImport,
+    HexagonAggregate,
+    Occurrence,
+    OccurrenceArea,
+    Species,
+    Dataset,
+    DATA_SRID,
+)
+from dashboard.views.tileserver import (
+    hexagon_aggregates_sizes,
+    refresh_hexagon_aggregates,
+)
+
+DEFAULT_BULK_BATCH_SIZE = 10000
+PARSING_CHUNK_SIZE = 5000  # Number of rows sent at once to a worker process (--workers)
+END_OF_ROWS = object()  # Sentinel
+
+OCCURRENCES_TABLE_NAME = Occurrence._meta.db_table
+LOCATION_COLUMN = Occurrence._meta.get_field("location").column
+DELTA_TABLE_NAME = "occurrences_import_delta"  # Temporary table, used with --delta
+# Temporary table of the previous and new values of the occurrences changed by a delta import, see
+# apply_occurrences_delta()
+CHANGES_TABLE_NAME = "occurrences_import_changes"
+BATCH_TABLE_NAME = (
+    "occurrences_import_batch"  # Temporary table, used by OccurrenceBulkWriter
+)
+STAGING_TABLE_NAME = staging_name(OCCURRENCES_TABLE_NAME)  # Used with --zero-downtime
+OCCURRENCE_AREAS_TABLE_NAME = OccurrenceArea._meta.db_table
+# Memberships of the staging occurrences, swapped together with them
+OCCURRENCE_AREAS_STAGING_TABLE_NAME = staging_name(OCCURRENCE_AREAS_TABLE_NAME)
+# Aggregates of the staging occurrences, swapped together with them
+HEXAGON_AGGREGATES_TABLE_NAME = HexagonAggregate._meta.db_table
+HEXAGON_AGGREGATES_STAGING_TABLE_NAME = staging_name(HEXAGON_AGGREGATES_TABLE_NAME)
+
+# Occurrence fields set by the importer (all of them, except the primary key)
+OCCURRENCE_WRITTEN_FIELDS = [
+    "gbif_id",
+    "species",
+    "source_dataset",
+    "individual_count",
+    "date",
+    "location",
+    "municipality",
+    "coordinates_uncertainty",
+    "georeference_remarks",
+    "is_catch",
+    "data_import",
+]
+# Same, without the location (computed from the coordinates by OccurrenceBulkWriter)
+OCCURRENCE_BATCH_FIELDS = [f for f in OCCURRENCE_WRITTEN_FIELDS if f != "location"]
+
+# The DwC-A terms used by the importer, in the order expected by parse_occurrence_row()
+OCCURRENCE_TERMS = [
+    "http://rs.gbif.org/terms/1.0/gbifID",
+    "http://rs.gbif.org/terms/1.0/acceptedTaxonKey",
+    "http://rs.gbif.org/terms/1.0/acceptedScientificName",
+    "http://rs.gbif.org/terms/1.0/datasetKey",
+    qn("datasetName"),
+    qn("year"),
+    qn("month"),
+    qn("day"),
+    qn("individualCount"),
+    qn("decimalLongitude"),
+    qn("decimalLatitude"),
+    qn("coordinateUncertaintyInMeters"),
+    qn("municipality"),
+    qn("georeferenceRemarks"),
+    qn("samplingProtocol"),
+    qn("eventType"),
+]
 
 
 def build_gbif_predicate(country_codes: List[str], species_ids: List[int]) -> Dict:
@@ -37,7 +138,9 @@ def build_gbif_predicate(country_codes: List[str], species_ids: List[int]) -> Di
     }
 
 
-def extract_gbif_download_id_from_dwca(dwca: DwCAReader) -> str:
+def extract_gbif_download_id_from_dwca(
+    dwca: Union[DwCAReader, StreamingDwCAReader]
+) -> str:
     e = dwca.metadata.find("dataset").find("alternateIdentifier")
     # As of 2025-03-13, GBIF has changed the field name...
     if e is not None:
@@ -52,103 +155,441 @@ def extract_gbif_download_id_from_dwca(dwca: DwCAReader) -> str:
         )
 
 
-def import_single_occurrence(row: CoreRow, current_data_import: DataImport):
+def parse_occurrence_row(row_values: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+    """Extract the occurrence fields from a DwC-A row (values of OCCURRENCE_TERMS, see iter_rows_values()).
+
+    Return None if the row should not be imported (other taxa, no year, no individuals). Species and dataset are
+    returned by name/key: resolving them is left to the caller, so this function doesn't touch the database (and can
+    run in a worker process).
+    """
+    (
+        gbif_id,
+        accepted_taxon_key,
+        accepted_scientific_name,
+        gbif_dataset_key,
+        gbif_dataset_name,
+        year_str,
+        month_str,
+        day_str,
+        individual_count_str,
+        decimal_longitude,
+        decimal_latitude,
+        coordinate_uncertainty,
+        municipality,
+        georeference_remarks,
+        sampling_protocol,
+        event_type,
+    ) = row_values
+
     try:
-        year = int(row.data[qn("year")])
+        year = int(year_str)
     except ValueError:
         year = None
 
     # individualCount is not always present - default to 1
     try:
-        ic = int(row.data[qn("individualCount")])
+        ic = int(individual_count_str)
     except ValueError:
         ic = 1
 
-    proceed_with_import = False
-    if (
-        int(row.data["http://rs.gbif.org/terms/1.0/acceptedTaxonKey"])
-        in settings.GBIF_TAXA_IDS_TO_IMPORT
+    if not (
+        int(accepted_taxon_key) in settings.GBIF_TAXA_IDS_TO_IMPORT
         and year is not None
         and ic > 0
     ):
-        proceed_with_import = True
+        return None
 
-    if proceed_with_import:
-        species, _ = Species.objects.get_or_create(
-            name=row.data["http://rs.gbif.org/terms/1.0/acceptedScientificName"]
-        )
+    # Coordinates are kept as floats (WGS84): bulk writers reproject whole batches at once in the database
+    try:
+        longitude, latitude = float(decimal_longitude), float(decimal_latitude)
+    except ValueError:
+        longitude, latitude = None, None
+
+    # Some dates are incomplete(year only)
+    try:
+        month = int(month_str)
+        day = int(day_str)
+    except ValueError:
+        month = 1
+        day = 1
+    date = datetime.date(year, month, day)
+
+    # coordinates uncertainty not always present
+    try:
+        cu = float(coordinate_uncertainty)
+    except ValueError:
+        cu = None
+
+    dataset_contains_only_catches = (
+        gbif_dataset_key in settings.GBIF_CATCHES_DATASET_KEY
+    )
+    sampling_protocol = sampling_protocol.lower()
+    event_type = event_type.lower()
+    record_flagged_as_catch = (
+        sampling_protocol == "rat trap"
+        or sampling_protocol.startswith("catch")
+        or event_type == "trap"
+    )
+
+    return {
+        "gbif_id": int(gbif_id),
+        "species_name": accepted_scientific_name,
+        "dataset_key": gbif_dataset_key,
+        "dataset_name": gbif_dataset_name,
+        "individual_count": ic,
+        "date": date,
+        "longitude": longitude,
+        "latitude": latitude,
+        "coordinates_uncertainty": cu,
+        "municipality": municipality,
+        "georeference_remarks": georeference_remarks,
+        "is_catch": dataset_contains_only_catches or record_flagged_as_catch,
+    }
+
+
+def parse_occurrence_rows(
+    rows_values: List[Tuple[str, ...]]
+) -> List[Optional[Dict[str, Any]]]:
+    """parse_occurrence_row() for a whole chunk of rows (unit of work for the process pool)"""
+    return [parse_occurrence_row(row_values) for row_values in rows_values]
+
+
+def parse_in_process_pool(
+    rows_values: Iterable[Tuple[str, ...]], workers: int
+) -> Iterator[Optional[Dict[str, Any]]]:
+    """Like map(parse_occurrence_row, rows_values), but the parsing is spread over a pool of worker processes.
+
+    Rows are sent to the workers in chunks, and the results are yielded in the original order (so the outcome is
+    identical to the serial path). The number of chunks in flight is bounded to keep memory usage under control.
+    """
+    rows_values = iter(
+        rows_values
+    )  # Chunks are sliced off it: a list would give its first chunk again and again
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        pending: Deque[AsyncResult] = deque()
+        chunk = list(itertools.islice(rows_values, PARSING_CHUNK_SIZE))
+        while chunk:
+            pending.append(pool.apply_async(parse_occurrence_rows, (chunk,)))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().get()
+            chunk = list(itertools.islice(rows_values, PARSING_CHUNK_SIZE))
 
-        gbif_dataset_key = row.data["http://rs.gbif.org/terms/1.0/datasetKey"]
-        gbif_dataset_name = row.data[qn("datasetName")]
+        while pending:
+            yield from pending.popleft().get()
 
-        # Ugly hack necessary to circumvent a GBIF bug (missing dataset names in Downloads).
-        if gbif_dataset_name == "":
-            gbif_dataset_name = get_dataset_name_from_gbif_api(gbif_dataset_key)
 
-        dataset, _ = Dataset.objects.get_or_create(
-            gbif_id=gbif_dataset_key,
-            defaults={"name": gbif_dataset_name},
+class DimensionCache:
+    """In-memory maps of the Species and Dataset tables, used to resolve the species/dataset of each occurrence.
+
+    Both tables are loaded once, so a lookup only hits the database the first time a new species or dataset is met.
+    """
+
+    def __init__(self):
+        self.species_ids: Dict[str, int] = dict(
+            Species.objects.values_list("name", "pk")
+        )
+        self.dataset_ids: Dict[str, int] = dict(
+            Dataset.objects.values_list("gbif_id", "pk")
         )
 
+    def species_id(self, name: str) -> int:
         try:
-            point = Point(
-                float(row.data[qn("decimalLongitude")]),
-                float(row.data[qn("decimalLatitude")]),
-                srid=4326,
-            )
-        except ValueError:
-            point = None
+            return self.species_ids[name]
+        except KeyError:
+            species, _ = Species.objects.get_or_create(name=name)
+            self.species_ids[name] = species.pk
+            return species.pk
 
-        # Some dates are incomplete(year only)
-        try:
-            month = int(row.data[qn("month")])
-            day = int(row.data[qn("day")])
-        except ValueError:
-            month = 1
-            day = 1
-        date = datetime.date(year, month, day)
-
-        # coordinates uncertainty not always present
+    def dataset_id(self, gbif_dataset_key: str, gbif_dataset_name: str) -> int:
         try:
-            cu = float(row.data[qn("coordinateUncertaintyInMeters")])
-        except ValueError:
-            cu = None
+            return self.dataset_ids[gbif_dataset_key]
+        except KeyError:
+            # Names can be missing because of a GBIF bug: empty names are fixed at the end of the import
+            # (fill_empty_dataset_names()), so the import doesn't wait for the GBIF API on each new dataset
+            dataset, _ = Dataset.objects.get_or_create(
+                gbif_id=gbif_dataset_key,
+                defaults={"name": gbif_dataset_name},
+            )
+            self.dataset_ids[gbif_dataset_key] = dataset.pk
+            return dataset.pk
+
+
+def location_point(values: Dict[str, Any]) -> Optional[Point]:
+    """The location (Point) of occurrence values returned by parse_occurrence_row(), or None"""
+    if values["longitude"] is None:
+        return None
+    return Point(values["longitude"], values["latitude"], srid=4326)
+
+
+def import_single_occurrence(
+    values: Dict[str, Any], current_data_import: DataImport, dimensions: DimensionCache
+) -> None:
+    """Insert a single occurrence (values returned by parse_occurrence_row()) in the database"""
+    Occurrence.objects.create(
+        gbif_id=values["gbif_id"],
+        species_id=dimensions.species_id(values["species_name"]),
+        source_dataset_id=dimensions.dataset_id(
+            values["dataset_key"], values["dataset_name"]
+        ),
+        individual_count=values["individual_count"],
+        date=values["date"],
+        location=location_point(values),
+        coordinates_uncertainty=values["coordinates_uncertainty"],
+        municipality=values["municipality"],
+        georeference_remarks=values["georeference_remarks"],
+        data_import=current_data_import,
+        is_catch=values["is_catch"],
+    )
+
+
+def _copy_text_value(value: Any) -> str:
+    """Format a value for PostgreSQL's COPY text format"""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
 
-        dataset_contains_only_catches = (
-            dataset.gbif_id in settings.GBIF_CATCHES_DATASET_KEY
+
+def occurrence_columns(fields: List[str]) -> List[str]:
+    """Database column names for those Occurrence fields"""
+    return [Occurrence._meta.get_field(f).column for f in fields]
+
+
+class OccurrenceBulkWriter:
+    """Buffer parsed occurrences and write them to the database in large batches.
+
+    method="copy" streams each batch through PostgreSQL's COPY, method="orm" uses bulk_create() instead.
+    With the "copy" method, rows are first copied (with raw WGS84 coordinates) in a temporary batch table, then moved
+    to the destination table with a single INSERT ... SELECT that reprojects all locations at once. The destination
+    can be another table than the occurrence table (table_name), as long as it has the OCCURRENCE_WRITTEN_FIELDS
+    columns.
+    Each batch is written in its own transaction (or savepoint). Don't forget to call flush() after the last add().
+    """
+
+    def __init__(
+        self,
+        current_data_import: DataImport,
+        dimensions: DimensionCache,
+        batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+        method: str = "copy",
+        table_name: str = OCCURRENCES_TABLE_NAME,
+        on_flush: Optional[Callable[[], None]] = None,
+    ):
+        self.current_data_import = current_data_import
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.method = method
+        self.table_name = table_name
+        self.on_flush = on_flush  # Called after each batch, in the same transaction
+        self.buffer: List[
+            Any
+        ] = []  # Tuples (see _copy_buffer()) or Occurrence objects (orm method)
+        self.written_count = 0
+        self._batch_table_created = False
+
+    def add(self, values: Dict[str, Any]) -> None:
+        species_id = self.dimensions.species_id(values["species_name"])
+        dataset_id = self.dimensions.dataset_id(
+            values["dataset_key"], values["dataset_name"]
         )
-        sampling_protocol = row.data[qn("samplingProtocol")].lower()
-        event_type = row.data.get("http://rs.tdwg.org/dwc/terms/eventType", "").lower()
-        record_flagged_as_catch = (
-            sampling_protocol == "rat trap"
-            or sampling_protocol.startswith("catch")
-            or event_type == "trap"
+
+        if self.method == "copy":
+            # Same order as OCCURRENCE_BATCH_FIELDS, then the coordinates
+            self.buffer.append(
+                (
+                    values["gbif_id"],
+                    species_id,
+                    dataset_id,
+                    values["individual_count"],
+                    values["date"],
+                    values["municipality"],
+                    values["coordinates_uncertainty"],
+                    values["georeference_remarks"],
+                    values["is_catch"],
+                    self.current_data_import.pk,
+                    values["longitude"],
+                    values["latitude"],
+                )
+            )
+        else:
+            self.buffer.append(
+                Occurrence(
+                    gbif_id=values["gbif_id"],
+                    species_id=species_id,
+                    source_dataset_id=dataset_id,
+                    individual_count=values["individual_count"],
+                    date=values["date"],
+                    location=location_point(values),
+                    coordinates_uncertainty=values["coordinates_uncertainty"],
+                    municipality=values["municipality"],
+                    georeference_remarks=values["georeference_remarks"],
+                    data_import=self.current_data_import,
+                    is_catch=values["is_catch"],
+                )
+            )
+
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+
+        with transaction.atomic():
+            if self.method == "copy":
+                self._copy_buffer()
+            else:
+                Occurrence.objects.bulk_create(self.buffer, batch_size=self.batch_size)
+
+            self.written_count += len(self.buffer)
+            if self.on_flush is not None:
+                self.on_flush()
+
+        self.buffer = []
+
+    def _copy_buffer(self) -> None:
+        data = io.StringIO()
+        for row in self.buffer:
+            data.write("\t".join(_copy_text_value(v) for v in row))
+            data.write("\n")
+        data.seek(0)
+
+        batch_columns = ", ".join(occurrence_columns(OCCURRENCE_BATCH_FIELDS))
+        with connection.cursor() as cursor:
+            if not self._batch_table_created:
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE IF NOT EXISTS {BATCH_TABLE_NAME} AS "
+                    f"SELECT {batch_columns}, NULL::float8 AS longitude, NULL::float8 AS latitude "
+                    f"FROM {OCCURRENCES_TABLE_NAME} WITH NO DATA"
+                )
+                self._batch_table_created = True
+
+            cursor.execute(f"TRUNCATE {BATCH_TABLE_NAME}")
+            cursor.copy_expert(
+                f"COPY {BATCH_TABLE_NAME} ({batch_columns}, longitude, latitude) FROM STDIN",
+                data,
+            )
+            cursor.execute(
+                f"""INSERT INTO {self.table_name} ({batch_columns}, {LOCATION_COLUMN})
+                SELECT {batch_columns}, ST_Transform(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326), %s)
+                FROM {BATCH_TABLE_NAME}""",
+                [DATA_SRID],
+            )
+
+
+def create_delta_table() -> None:
+    """Create a temporary table (dropped at commit) that receives the occurrences of the new archive in delta mode"""
+    columns = ", ".join(occurrence_columns(OCCURRENCE_WRITTEN_FIELDS))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {DELTA_TABLE_NAME} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {OCCURRENCES_TABLE_NAME} WITH NO DATA"
         )
 
-        Occurrence.objects.create(
-            gbif_id=int(row.data["http://rs.gbif.org/terms/1.0/gbifID"]),
-            species=species,
-            source_dataset=dataset,
-            individual_count=ic,
-            date=date,
-            location=point,
-            coordinates_uncertainty=cu,
-            municipality=row.data[qn("municipality")],
-            georeference_remarks=row.data[qn("georeferenceRemarks")],
-            data_import=current_data_import,
-            is_catch=(dataset_contains_only_catches or record_flagged_as_catch),
+
+def apply_occurrences_delta(current_data_import: DataImport) -> Dict[str, int]:
+    """Make the occurrence table match the content of the delta table, comparing occurrences by gbif_id.
+
+    - occurrences that are not in the new archive anymore are deleted
+    - occurrences whose content changed are updated (and linked to current_data_import)
+    - new occurrences are inserted
+    Other occurrences are left untouched. Return the number of occurrences in each category.
+
+    The changed occurrences are recorded in a temporary table (CHANGES_TABLE_NAME, dropped at commit), so the derived
+    tables can be updated incrementally (see HexagonAggregate.apply_changes() and OccurrenceArea.apply_changes()): their
+    id, the (aggregated) fields and a sign column: -1 for the previous values of the deleted and updated occurrences, 1
+    for the new values of the updated and new occurrences.
+    """
+    gbif_id_col = Occurrence._meta.get_field("gbif_id").column
+    data_import_col = Occurrence._meta.get_field("data_import").column
+    columns = occurrence_columns(OCCURRENCE_WRITTEN_FIELDS)
+    compared_columns = occurrence_columns(
+        [f for f in OCCURRENCE_WRITTEN_FIELDS if f not in ("gbif_id", "data_import")]
+    )
+    changes_columns = ["id"] + occurrence_columns(
+        ["location", "species", "source_dataset", "is_catch", "date"]
+    )
+    occ_changes_columns = ", ".join(f"occ.{c}" for c in changes_columns)
+    changed_rows = f"changed_rows ({', '.join(changes_columns)})"
+    is_changed = f"""delta.{gbif_id_col} = occ.{gbif_id_col}
+        AND ({", ".join(f"occ.{c}" for c in compared_columns)})
+            IS DISTINCT FROM ({", ".join(f"delta.{c}" for c in compared_columns)})"""
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE INDEX ON {DELTA_TABLE_NAME} ({gbif_id_col})")
+        cursor.execute(f"ANALYZE {DELTA_TABLE_NAME}")
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {CHANGES_TABLE_NAME} ON COMMIT DROP AS "
+            f"SELECT {', '.join(changes_columns)}, 0 AS sign FROM {OCCURRENCES_TABLE_NAME} WITH NO DATA"
         )
 
+        cursor.execute(
+            f"""WITH {changed_rows} AS (
+                DELETE FROM {OCCURRENCES_TABLE_NAME} AS occ WHERE NOT EXISTS (
+                    SELECT 1 FROM {DELTA_TABLE_NAME} AS delta WHERE delta.{gbif_id_col} = occ.{gbif_id_col}
+                ) RETURNING {occ_changes_columns}
+            )
+            INSERT INTO {CHANGES_TABLE_NAME} SELECT *, -1 FROM changed_rows"""
+        )
+        deleted_count = cursor.rowcount
+
+        cursor.execute(
+            f"""INSERT INTO {CHANGES_TABLE_NAME}
+            SELECT {occ_changes_columns}, -1
+            FROM {OCCURRENCES_TABLE_NAME} AS occ INNER JOIN {DELTA_TABLE_NAME} AS delta ON {is_changed}"""
+        )
+        cursor.execute(
+            f"""WITH {changed_rows} AS (
+                UPDATE {OCCURRENCES_TABLE_NAME} AS occ
+                SET ({", ".join(compared_columns)}, {data_import_col}) =
+                    ({", ".join(f"delta.{c}" for c in compared_columns)}, %s)
+                FROM {DELTA_TABLE_NAME} AS delta
+                WHERE {is_changed}
+                RETURNING {occ_changes_columns}
+            )
+            INSERT INTO {CHANGES_TABLE_NAME} SELECT *, 1 FROM changed_rows""",
+            [current_data_import.pk],
+        )
+        updated_count = cursor.rowcount
+
+        cursor.execute(
+            f"""WITH {changed_rows} AS (
+                INSERT INTO {OCCURRENCES_TABLE_NAME} ({", ".join(columns)})
+                SELECT {", ".join(columns)} FROM {DELTA_TABLE_NAME} AS delta WHERE NOT EXISTS (
+                    SELECT 1 FROM {OCCURRENCES_TABLE_NAME} AS occ WHERE occ.{gbif_id_col} = delta.{gbif_id_col}
+                ) RETURNING {", ".join(changes_columns)}
+            )
+            INSERT INTO {CHANGES_TABLE_NAME} SELECT *, 1 FROM changed_rows"""
+        )
+        new_count = cursor.rowcount
+        cursor.execute(f"ANALYZE {CHANGES_TABLE_NAME}")
+
+        cursor.execute(f"SELECT COUNT(*) FROM {DELTA_TABLE_NAME}")
+        total_count = cursor.fetchone()[0]
+
+    return {
+        "new": new_count,
+        "updated": updated_count,
+        "deleted": deleted_count,
+        "unchanged": total_count - new_count - updated_count,
+    }
+
 
 class Command(BaseCommand):
-    help = """Import new observations and delete previous ones. 
-    
+    help = """Import new observations and delete previous ones.
+
     By default, a new download is generated at GBIF. "
     The --source-dwca option can be used to provide an existing local file instead."""
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.transaction_was_successful = False
+        self.timer = PhaseTimer()
 
     def flag_transaction_as_successful(self):
         self.transaction_was_successful = True
@@ -159,8 +600,86 @@ class Command(BaseCommand):
             type=argparse.FileType("r"),
             help="Use an existing dwca file as source (otherwise a new GBIF download will be generated and downloaded)",
         )
+        parser.add_argument(
+            "--streaming",
+            action="store_true",
+            help="Read the archive with a streaming reader (core file decompressed on the fly, constant memory) "
+            "instead of DwCAReader",
+        )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Buffer occurrences and insert them in large batches instead of one INSERT per row",
+        )
+        parser.add_argument(
+            "--bulk-method",
+            choices=["copy", "orm"],
+            default="copy",
+            help="How batches are written in bulk mode: PostgreSQL COPY (default) or Django's bulk_create()",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BULK_BATCH_SIZE,
+            help=f"Number of occurrences per batch in bulk mode (default: {DEFAULT_BULK_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes used to parse the DwC-A rows (default: 1, no worker processes)",
+        )
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument(
+            "--delta",
+            action="store_true",
+            help="Only apply the differences (by gbif_id) between the archive and the current occurrences, instead of "
+            "replacing all of them. Implies --bulk (COPY method)",
+        )
+        mode.add_argument(
+            "--zero-downtime",
+            action="store_true",
+            help="Load the occurrences in a staging table that replaces the occurrence table at the end, instead of "
+            "putting the website in maintenance mode. Implies --bulk (COPY method)",
+        )
+        mode.add_argument(
+            "--resume",
+            type=int,
+            metavar="DATA_IMPORT_ID",
+            help="Resume a failed --zero-downtime import from its last checkpoint (the archive is not downloaded again)",
+        )
+        parser.add_argument(
+            "--profile",
+            metavar="PATH",
+            help="Profile the import (main process only) with cProfile and save the stats to this file",
+        )
 
     def handle(self, *args, **options) -> None:
+        if (options["delta"] or options["zero_downtime"] or options["resume"]) and (
+            options["bulk_method"] != "copy"
+        ):
+            raise CommandError(
+                "--delta, --zero-downtime and --resume can only be used with the copy bulk method"
+            )
+
+        profiler = None
+        if options["profile"]:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        try:
+            self._handle(options)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(options["profile"])
+                self.stdout.write(f"Profiling data saved to {options['profile']}")
+
+    def _handle(self, options: Dict) -> None:
+        if options["resume"]:
+            self._resume_staging_table_import(options["resume"], options)
+            return
+
         self.stdout.write("(Re)importing all observations")
 
         gbif_predicate = None
@@ -172,26 +691,47 @@ class Command(BaseCommand):
                 "Will create a GBIF download and wait for it, this can takes a long time..."
             )
 
-            tmp_file = tempfile.NamedTemporaryFile()
-            source_data_path = tmp_file.name
+            if options["zero_downtime"]:
+                # The archive is kept until the end of the import, so the import can be resumed (--resume) if needed
+                os.makedirs(settings.DATASET_TEMPORARY_DIR, exist_ok=True)
+                source_data_path = os.path.join(
+                    settings.DATASET_TEMPORARY_DIR,
+                    f"occurrences_{timezone.now():%Y%m%d%H%M%S}.zip",
+                )
+            else:
+                tmp_file = tempfile.NamedTemporaryFile()
+                source_data_path = tmp_file.name
             # This might takes several minutes...
             gbif_predicate = build_gbif_predicate(
                 country_codes=settings.GBIF_COUNTRIES_TO_IMPORT,
                 species_ids=settings.GBIF_TAXA_IDS_TO_IMPORT,
             )
 
-            download_gbif_occurrences(
-                gbif_predicate,
-                username=settings.GBIF_USERNAME,
-                password=settings.GBIF_PASSWORD,
-                output_path=source_data_path,
-            )
+            with self.timer.phase("download"):
+                download_gbif_occurrences(
+                    gbif_predicate,
+                    username=settings.GBIF_USERNAME,
+                    password=settings.GBIF_PASSWORD,
+                    output_path=source_data_path,
+                )
             self.stdout.write(
-                "We now have a (locally accessible) source dwca, real import is starting. We'll use a transaction and put "
-                "the website in maintenance mode"
+                "We now have a (locally accessible) source dwca, real import is starting"
+            )
+
+        if options["zero_downtime"]:
+            self._import_through_staging_table(
+                source_data_path, gbif_predicate, options
             )
+        else:
+            self._import_in_maintenance_mode(source_data_path, gbif_predicate, options)
 
-        self.stdout.write("We'll put the website in maintenance mode during the import")
+    def _import_in_maintenance_mode(
+        self, source_data_path: str, gbif_predicate: Optional[Dict], options: Dict
+    ) -> None:
+        """Import in a single transaction, the website is in maintenance mode in the meantime"""
+        self.stdout.write(
+            "We'll use a transaction and put the website in maintenance mode during the import"
+        )
         set_maintenance_mode(True)
         try:
             with transaction.atomic():
@@ -204,27 +744,81 @@ class Command(BaseCommand):
                     f"Created a new DataImport object: #{current_data_import.pk}"
                 )
 
-                with DwCAReader(source_data_path) as dwca:
+                with open_dwca(source_data_path, options["streaming"]) as dwca:
                     current_data_import.set_gbif_download_id(
                         extract_gbif_download_id_from_dwca(dwca)
                     )
 
-                    self._import_all_observations_from_dwca(dwca, current_data_import)
+                    target_table = None
+                    if options["delta"]:
+                        create_delta_table()
+                        target_table = DELTA_TABLE_NAME
 
-                self.stdout.write(
-                    "All occurrences imported, now deleting occurrences linked to previous data imports..."
-                )
+                    (
+                        read_count,
+                        imported_count,
+                    ) = self._import_all_observations_from_dwca(
+                        dwca, current_data_import, options, target_table=target_table
+                    )
+
+                if options["delta"]:
+                    self.stdout.write(
+                        "Archive loaded, now applying the differences to the occurrence table..."
+                    )
+                    with self.timer.phase("apply_delta"):
+                        counts = apply_occurrences_delta(current_data_import)
+                    self.stdout.write(
+                        f"{counts['new']} new, {counts['updated']} updated, {counts['deleted']} deleted and "
+                        f"{counts['unchanged']} unchanged occurrences"
+                    )
+                else:
+                    self.stdout.write(
+                        "All occurrences imported, now deleting occurrences linked to previous data imports..."
+                    )
 
-                # 4. Remove previous observations
-                Occurrence.objects.exclude(data_import=current_data_import).delete()
+                    # 4. Remove previous observations
+                    with self.timer.phase("delete_previous"):
+                        deleted_count, _ = Occurrence.objects.exclude(
+                            data_import=current_data_import
+                        ).delete()
+                    counts = {"new": imported_count, "deleted": deleted_count}
 
-                # 5. Remove unused species entries
+                with self.timer.phase("hexagon_aggregates"):
+                    if options["delta"]:
+                        self.stdout.write(
+                            "Updating the hexagon aggregates of the changed occurrences"
+                        )
+                        HexagonAggregate.apply_changes(
+                            hexagon_aggregates_sizes(), CHANGES_TABLE_NAME
+                        )
+                    else:
+                        self.stdout.write("Refreshing the hexagon aggregates")
+                        refresh_hexagon_aggregates()
+
+                # 5. Remove unused species entries (after the aggregates: those of a delta import reference them)
                 Species.objects.filter(occurrence__isnull=True).delete()
 
+                with self.timer.phase("occurrence_areas"):
+                    if options["delta"]:
+                        self.stdout.write(
+                            "Updating the memberships in areas of the changed occurrences"
+                        )
+                        OccurrenceArea.apply_changes(CHANGES_TABLE_NAME)
+                    else:
+                        self.stdout.write(
+                            "Refreshing the occurrences memberships in areas"
+                        )
+                        OccurrenceArea.refresh()
+
                 # 4. Finalize the DataImport object
                 self.stdout.write("Updating the DataImport object")
+                current_data_import.set_occurrences_counts(**counts)
                 current_data_import.complete()
-                self.stdout.write("Done.")
+                commit_start = time.perf_counter()
+
+            self.timer.add("commit", time.perf_counter() - commit_start)
+            self._save_metrics(current_data_import, read_count, imported_count)
+            self.stdout.write("Done.")
 
             self.stdout.write("Sending email report")
             if self.transaction_was_successful:
@@ -236,10 +830,274 @@ class Command(BaseCommand):
             self.stdout.write("Leaving maintenance mode.")
             set_maintenance_mode(False)
 
+    def _import_through_staging_table(
+        self, source_data_path: str, gbif_predicate: Optional[Dict], options: Dict
+    ) -> None:
+        """Import in a staging table, swapped with the occurrence table at the end
+
+        The website stays available (with the previous data) during the whole import.
+        """
+        current_data_import = DataImport.objects.create(
+            start=timezone.now(),
+            gbif_predicate=gbif_predicate,
+            source_dwca_path=os.path.abspath(source_data_path),
+        )
+        self.stdout.write(f"Created a new DataImport object: #{current_data_import.pk}")
+
+        create_staging_table(OCCURRENCES_TABLE_NAME, STAGING_TABLE_NAME)
+        self._load_staging_table(current_data_import, options)
+
+    def _resume_staging_table_import(self, data_import_id: int, options: Dict) -> None:
+        try:
+            current_data_import = DataImport.objects.get(
+                pk=data_import_id, end__isnull=True
+            )
+        except DataImport.DoesNotExist:
+            raise CommandError(f"No unfinished DataImport #{data_import_id}")
+
+        if not current_data_import.source_dwca_path:
+            raise CommandError(
+                f"DataImport #{data_import_id} was not a --zero-downtime import, it cannot be resumed"
+            )
+        if current_data_import.staging_swapped:
+            self.stdout.write(
+                f"The tables of DataImport #{data_import_id} were already swapped, finishing it"
+            )
+            self._complete_staging_table_import(
+                current_data_import,
+                current_data_import.checkpoint_rows_offset,
+                current_data_import.checkpoint_imported_count,
+            )
+            return
+        if not os.path.exists(current_data_import.source_dwca_path):
+            raise CommandError(
+                f"The archive of DataImport #{data_import_id} is not available anymore: "
+                f"{current_data_import.source_dwca_path}"
+            )
+
+        self.stdout.write(
+            f"Resuming DataImport #{data_import_id} after row {current_data_import.checkpoint_rows_offset}"
+        )
+        self._load_staging_table(current_data_import, options)
+
+    def _load_staging_table(self, current_data_import: DataImport, options: Dict):
+        """Import in the staging table (starting from the last checkpoint), then swap it with the occurrence table
+
+        Each batch is committed with a checkpoint on current_data_import, so the process can be resumed if it fails.
+        """
+        skipped_rows = current_data_import.checkpoint_rows_offset
+        previously_imported_count = current_data_import.checkpoint_imported_count
+
+        self.stdout.write(f"Loading occurrences in {STAGING_TABLE_NAME}")
+        try:
+            with open_dwca(
+                current_data_import.source_dwca_path, options["streaming"]
+            ) as dwca:
+                current_data_import.set_gbif_download_id(
+                    extract_gbif_download_id_from_dwca(dwca)
+                )
+                read_count, imported_count = self._import_all_observations_from_dwca(
+                    dwca,
+                    current_data_import,
+                    options,
+                    target_table=STAGING_TABLE_NAME,
+                    skip_rows=skipped_rows,
+                    checkpoint=True,
+                )
+        except Exception:
+            self.stderr.write(
+                f"Import failed, it can be resumed with --resume {current_data_import.pk}"
+            )
+            raise
+        read_count += skipped_rows
+        imported_count += previously_imported_count
+
+        self.stdout.write("Building indexes and constraints on the staging table")
+        with self.timer.phase("build_indexes"):
+            finalize_staging_table(OCCURRENCES_TABLE_NAME, STAGING_TABLE_NAME)
+
+        self.stdout.write(
+            "Computing the memberships in areas of the staging occurrences"
+        )
+        with self.timer.phase("occurrence_areas"):
+            create_staging_table(
+                OCCURRENCE_AREAS_TABLE_NAME, OCCURRENCE_AREAS_STAGING_TABLE_NAME
+            )
+            with connection.cursor() as cursor:
+                OccurrenceArea.insert_memberships(
+                    cursor, STAGING_TABLE_NAME, OCCURRENCE_AREAS_STAGING_TABLE_NAME
+                )
+            finalize_staging_table(
+                OCCURRENCE_AREAS_TABLE_NAME, OCCURRENCE_AREAS_STAGING_TABLE_NAME
+            )
+
+        self.stdout.write("Computing the hexagon aggregates of the staging occurrences")
+        with self.timer.phase("hexagon_aggregates"):
+            create_staging_table(
+                HEXAGON_AGGREGATES_TABLE_NAME, HEXAGON_AGGREGATES_STAGING_TABLE_NAME
+            )
+            with connection.cursor() as cursor:
+                HexagonAggregate.insert_aggregates(
+                    cursor,
+                    hexagon_aggregates_sizes(),
+                    STAGING_TABLE_NAME,
+                    HEXAGON_AGGREGATES_STAGING_TABLE_NAME,
+                )
+            finalize_staging_table(
+                HEXAGON_AGGREGATES_TABLE_NAME, HEXAGON_AGGREGATES_STAGING_TABLE_NAME
+            )
+
+        previous_count = Occurrence.objects.count()
+        with self.timer.phase("swap"), transaction.atomic():
+            self.stdout.write("Swapping the staging and live tables")
+            swap_staging_table(OCCURRENCES_TABLE_NAME, STAGING_TABLE_NAME)
+            swap_staging_table(
+                OCCURRENCE_AREAS_TABLE_NAME, OCCURRENCE_AREAS_STAGING_TABLE_NAME
+            )
+            swap_staging_table(
+                HEXAGON_AGGREGATES_TABLE_NAME, HEXAGON_AGGREGATES_STAGING_TABLE_NAME
+            )
+
+            # Remove unused species entries
+            Species.objects.filter(occurrence__isnull=True).delete()
+
+            # A resumed import will skip to the steps below
+            current_data_import.save_staging_swapped(
+                new=imported_count, deleted=previous_count
+            )
+
+        self._complete_staging_table_import(
+            current_data_import, read_count, imported_count
+        )
+
+    def _complete_staging_table_import(
+        self, current_data_import: DataImport, read_count: int, imported_count: int
+    ) -> None:
+        """Steps after the swap of the staging tables"""
+        self.stdout.write("Updating the DataImport object")
+        current_data_import.complete()
+        self._save_metrics(current_data_import, read_count, imported_count)
+
+        if current_data_import.gbif_predicate is not None and os.path.exists(
+            current_data_import.source_dwca_path
+        ):
+            self.stdout.write("Deleting the downloaded archive")
+            os.remove(current_data_import.source_dwca_path)
+        self.stdout.write("Done.")
+
+    def _save_metrics(
+        self, current_data_import: DataImport, read_count: int, imported_count: int
+    ) -> None:
+        for phase, duration in self.timer.durations.items():
+            self.stdout.write(f"{phase}: {duration:.1f}s")
+
+        current_data_import.set_metrics(
+            phase_durations=self.timer.durations,
+            rows_read=read_count,
+            rows_imported=imported_count,
+            peak_rss_kb=peak_rss_kb(),
+        )
+
     def _import_all_observations_from_dwca(
-        self, dwca: DwCAReader, current_data_import: DataImport
-    ):
-        for i, core_row in enumerate(dwca):
-            import_single_occurrence(core_row, current_data_import)
-            if i % 1000 == 0:
+        self,
+        dwca: Union[DwCAReader, StreamingDwCAReader],
+        current_data_import: DataImport,
+        options: Dict,
+        target_table: Optional[str] = None,
+        skip_rows: int = 0,
+        checkpoint: bool = False,
+    ) -> Tuple[int, int]:
+        """Import the occurrences of the archive, return the number of rows read and of imported occurrences.
+
+        If target_table is set, occurrences are written (in bulk mode, with COPY) to this table instead of the
+        occurrence table. The first skip_rows rows of the archive are ignored. If checkpoint is True, the position in
+        the archive is saved on current_data_import each time a batch is written (see DataImport.save_checkpoint()).
+        """
+        dimensions = DimensionCache()
+        writer = None
+        if target_table is not None:
+            on_flush = None
+            if checkpoint:
+                previously_imported_count = (
+                    current_data_import.checkpoint_imported_count
+                )
+
+                def on_flush():
+                    current_data_import.save_checkpoint(
+                        rows_offset=skip_rows + rows_count,
+                        imported_count=previously_imported_count + writer.written_count,
+                    )
+
+            writer = OccurrenceBulkWriter(
+                current_data_import,
+                dimensions,
+                batch_size=options["batch_size"],
+                table_name=target_table,
+                on_flush=on_flush,
+            )
+        elif options["bulk"]:
+            self.stdout.write(
+                f"Bulk mode: batches of {options['batch_size']} occurrences, method: {options['bulk_method']}"
+            )
+            writer = OccurrenceBulkWriter(
+                current_data_import,
+                dimensions,
+                batch_size=options["batch_size"],
+                method=options["bulk_method"],
+            )
+
+        rows_values = itertools.islice(
+            iter_rows_values(dwca, OCCURRENCE_TERMS), skip_rows, None
+        )
+        if options["workers"] > 1:
+            self.stdout.write(
+                f"Parsing rows with {options['workers']} worker processes"
+            )
+            parsed_rows = parse_in_process_pool(rows_values, options["workers"])
+        else:
+            parsed_rows = map(parse_occurrence_row, rows_values)
+        parsed_rows = iter(parsed_rows)
+
+        start_time = time.perf_counter()
+        rows_count = 0
+        imported_count = 0
+        parsing_time = 0.0
+        writing_time = 0.0
+        while True:
+            t0 = time.perf_counter()
+            values = next(parsed_rows, END_OF_ROWS)
+            t1 = time.perf_counter()
+            parsing_time += t1 - t0
+            if values is END_OF_ROWS:
+                break
+
+            rows_count += 1
+            if values is not None:
+                if writer is not None:
+                    writer.add(values)
+                else:
+                    import_single_occurrence(values, current_data_import, dimensions)
+                imported_count += 1
+                writing_time += time.perf_counter() - t1
+
+            if rows_count % 1000 == 1:
                 self.stdout.write(".")
+
+        if writer is not None:
+            with self.timer.phase("write"):
+                writer.flush()
+
+        self.timer.add("read_and_parse", parsing_time)
+        self.timer.add("write", writing_time)
+
+        with self.timer.phase("dataset_names"):
+            fixed_count = fill_empty_dataset_names()
+        if fixed_count:
+            self.stdout.write(f"{fixed_count} dataset names retrieved from GBIF")
+
+        elapsed = time.perf_counter() - start_time
+        self.stdout.write(
+            f"{imported_count} occurrences imported ({rows_count - imported_count} rows skipped) in {elapsed:.1f}s "
+            f"({rows_count / elapsed if elapsed else 0:.0f} rows/s)"
+        )
+        return rows_count, imported_count
@@ -4,7 +4,7 @@ import sys
 from django.contrib.gis.utils.layermapping import LayerMapping
 from django.core.management.base import BaseCommand, CommandParser
 
-from dashboard.models import Area
+from dashboard.models import Area, refresh_area_derived_tables
 
 THIS_DIR = os.path.dirname(__file__)
 
@@ -47,3 +47,6 @@ class Command(BaseCommand):
 
         lm = LayerMapping(Area, os.path.join(SOURCE_DIRECTORY, filename), mapping)
         lm.save(verbose=True)
+
+        self.stdout.write("Refreshing the tables derived from areas")
+        refresh_area_derived_tables()
@@ -2,16 +2,34 @@ import datetime
 
 from django.contrib.gis.geos import Point
 from django.core.management import BaseCommand, CommandParser
+from django.db import connection, transaction
 
 from dwca.darwincore.utils import qualname as qn
 
-from dwca.read import DwCAReader
-
+from dashboard.management.commands._helpers import open_dwca, iter_rows_values
 from dashboard.models import (
+    AreaBiodiversitySummary,
     BiodiversityIndicatorObservation,
     BiodiversityIndicatorSpecies,
+    ReferenceDataLoad,
 )
 
+BATCH_SIZE = 5000  # Observations per INSERT
+
+# The DwC-A terms used by this command, in the order they are unpacked
+BIODIVERSITY_OBSERVATION_TERMS = [
+    "http://rs.gbif.org/terms/1.0/gbifID",
+    "http://rs.gbif.org/terms/1.0/acceptedScientificName",
+    qn("year"),
+    qn("month"),
+    qn("day"),
+    qn("decimalLongitude"),
+    qn("decimalLatitude"),
+    qn("kingdom"),
+    qn("class"),
+    qn("order"),
+]
+
 
 class Command(BaseCommand):
     help = (
@@ -32,53 +50,86 @@ class Command(BaseCommand):
             help="Remove existing data (observations from LIFE MICA surveys) before importing",
         )
 
+        parser.add_argument(
+            "--streaming",
+            action="store_true",
+            help="Read the archive with a streaming reader (core file decompressed on the fly, constant memory) "
+            "instead of DwCAReader",
+        )
+
     def handle(self, *args, **options) -> None:
-        pass
         filename = options["dwca"]
 
-        if options["truncate"]:
-            self.stdout.write("Truncating existing data")
-            for obs in BiodiversityIndicatorObservation.objects.all():
-                obs.delete()
-
-        self.stdout.write("Importing new observations")
-        with DwCAReader(filename) as dwca:
-            for row in dwca:
-                gbif_id = row.data["http://rs.gbif.org/terms/1.0/gbifID"]
-                scientific_name = row.data[
-                    "http://rs.tdwg.org/dwc/terms/scientificName"
-                ]
-
-                year = int(row.data[qn("year")])
-                month = int(row.data[qn("month")])
-                day = int(row.data[qn("day")])
-
-                date = datetime.date(year, month, day)
-                location = Point(
-                    float(row.data[qn("decimalLongitude")]),
-                    float(row.data[qn("decimalLatitude")]),
-                    srid=4326,
-                )
-
-                species, _ = BiodiversityIndicatorSpecies.objects.get_or_create(
-                    scientific_name=row.data[
-                        "http://rs.gbif.org/terms/1.0/acceptedScientificName"
-                    ],
-                    defaults={
-                        "s_kingdom": row.data[qn("kingdom")],
-                        "s_class": row.data[qn("class")],
-                        "s_order": row.data[qn("order")],
-                    },
-                )
-
-                BiodiversityIndicatorObservation.objects.create(
-                    gbif_id=gbif_id, species=species, date=date, location=location
-                )
-                self.stdout.write(f"Imported observation {gbif_id}")
-
-        self.stdout.write("Assigning groups to species")
-        for species in BiodiversityIndicatorSpecies.objects.all():
-            species.auto_set_species_group()
-            species.save()
+        with transaction.atomic():
+            if options["truncate"]:
+                self.stdout.write("Truncating existing data")
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"TRUNCATE {BiodiversityIndicatorObservation._meta.db_table}"
+                    )
+
+            self.stdout.write("Importing new observations")
+            species_by_name = {
+                species.scientific_name: species
+                for species in BiodiversityIndicatorSpecies.objects.all()
+            }
+            observations = []
+            imported_count = 0
+            with open_dwca(filename, options["streaming"]) as dwca:
+                for (
+                    gbif_id,
+                    accepted_scientific_name,
+                    year,
+                    month,
+                    day,
+                    decimal_longitude,
+                    decimal_latitude,
+                    kingdom,
+                    s_class,
+                    order,
+                ) in iter_rows_values(dwca, BIODIVERSITY_OBSERVATION_TERMS):
+                    date = datetime.date(int(year), int(month), int(day))
+                    location = Point(
+                        float(decimal_longitude),
+                        float(decimal_latitude),
+                        srid=4326,
+                    )
+
+                    try:
+                        species = species_by_name[accepted_scientific_name]
+                    except KeyError:
+                        species = BiodiversityIndicatorSpecies.objects.create(
+                            scientific_name=accepted_scientific_name,
+                            s_kingdom=kingdom,
+                            s_class=s_class,
+                            s_order=order,
+                        )
+                        species_by_name[accepted_scientific_name] = species
+
+                    observations.append(
+                        BiodiversityIndicatorObservation(
+                            gbif_id=gbif_id,
+                            species=species,
+                            date=date,
+                            location=location,
+                        )
+                    )
+                    if len(observations) >= BATCH_SIZE:
+                        BiodiversityIndicatorObservation.objects.bulk_create(
+                            observations
+                        )
+                        imported_count += len(observations)
+                        observations = []
+
+            BiodiversityIndicatorObservation.objects.bulk_create(observations)
+            imported_count += len(observations)
+            self.stdout.write(f"Imported {imported_count} observations")
+
+            self.stdout.write("Assigning groups to species")
+            BiodiversityIndicatorSpecies.auto_set_all_species_groups()
+
+            self.stdout.write("Summarizing observations per area")
+            AreaBiodiversitySummary.refresh()
+            ReferenceDataLoad.record(ReferenceDataLoad.BIODIVERSITY_INDICATORS)
 
         self.stdout.write("Done")
@@ -3,7 +3,7 @@ import os
 from django.contrib.gis.utils import LayerMapping
 from django.core.management import BaseCommand
 
-from dashboard.models import FishnetSquare
+from dashboard.models import FishnetSquare, ReferenceDataLoad
 
 THIS_DIR = os.path.dirname(__file__)
 
@@ -23,3 +23,4 @@ class Command(BaseCommand):
     def handle(self, *args, **options) -> None:
         lm = LayerMapping(FishnetSquare, SOURCE_SHAPEFILE_PATH, MAPPING)
         lm.save(verbose=True)
+        ReferenceDataLoad.record(ReferenceDataLoad.FISHNET)
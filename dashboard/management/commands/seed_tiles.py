@@ -0,0 +1,214 @@
+import datetime
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Tuple, List, Dict, Any, Optional
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError, CommandParser
+from django.db import connection
+from django.http import QueryDict
+
+from dashboard.cache import current_data_version, filters_key, compress
+from dashboard.models import Species
+from dashboard.tile_store import default_tile_store, metatile_origin
+from dashboard.views.tileserver import (
+    HEX_AGGREGATED_OCCURRENCES_LAYER,
+    OCCURRENCES_FOR_WATER_LAYER,
+    hex_aggregated_occurrences_metatile,
+    occurrences_for_water_metatile,
+)
+
+BENELUX_BBOX = (2.5, 49.4, 7.3, 53.6)  # min lon, min lat, max lon, max lat (WGS84)
+
+# Layer -> metatile render function
+LAYERS = {
+    HEX_AGGREGATED_OCCURRENCES_LAYER: hex_aggregated_occurrences_metatile,
+    OCCURRENCES_FOR_WATER_LAYER: occurrences_for_water_metatile,
+}
+
+# Render function parameter -> request parameter (as sent by the dashboard, see dashboard.js)
+FILTERS_REQUEST_PARAMS = {
+    "dataset_id": "datasetId",
+    "species_id": "speciesId",
+    "start_date": "startDate",
+    "end_date": "endDate",
+    "records_type": "recordsType",
+}
+
+PROGRESS_EVERY = 100  # metatiles
+
+
+def lonlat_to_tile(lon: float, lat: float, zoom: int) -> Tuple[int, int]:
+    """Return the x, y coordinates of the tile containing this point (XYZ / "slippy map" scheme)"""
+    n = 2**zoom
+    lat_rad = math.radians(lat)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bbox(
+    zoom: int, bbox: Tuple[float, float, float, float]
+) -> Iterator[Tuple[int, int]]:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    min_x, min_y = lonlat_to_tile(min_lon, max_lat, zoom)  # y grows southwards
+    max_x, max_y = lonlat_to_tile(max_lon, min_lat, zoom)
+    for x in range(min_x, max_x + 1):
+        for y in range(min_y, max_y + 1):
+            yield x, y
+
+
+def previous_month() -> Tuple[datetime.date, datetime.date]:
+    """First and last day of the previous month (default period of the dashboard)"""
+    last_day = datetime.date.today().replace(day=1) - datetime.timedelta(days=1)
+    return last_day.replace(day=1), last_day
+
+
+def filter_presets(
+    start_date: Optional[datetime.date], end_date: Optional[datetime.date]
+) -> List[Dict[str, Any]]:
+    """No filter, each species, catches, observations (all of them for the given period)"""
+    period = {"start_date": start_date, "end_date": end_date}
+    presets = [dict(period)]
+    presets += [
+        dict(period, species_id=species_id)
+        for species_id in Species.objects.values_list("pk", flat=True)
+    ]
+    presets += [
+        dict(period, records_type=records_type)
+        for records_type in ("catches", "observations")
+    ]
+    return presets
+
+
+def request_filters_key(filters: Dict[str, Any]) -> str:
+    """The filters key of the tile store for the request a dashboard user would send for these filters"""
+    params = {
+        FILTERS_REQUEST_PARAMS[name]: value.isoformat()
+        if isinstance(value, datetime.date)
+        else value
+        for name, value in filters.items()
+        if value is not None
+    }
+    return filters_key(QueryDict(urlencode(params)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Render and store the map tiles most likely to be requested: low zoom levels over the Benelux, for common "
+        "filters (no filter, each species, catches, observations). To be run after importing occurrences."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--min-zoom", type=int, default=5)
+        parser.add_argument(
+            "--max-zoom",
+            type=int,
+            default=10,
+            help="Tiles are 4x more numerous at each zoom level (the hexagons layer is used up to zoom 12)",
+        )
+        parser.add_argument(
+            "--layers",
+            nargs="+",
+            choices=list(LAYERS.keys()),
+            default=list(LAYERS.keys()),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of metatiles rendered in parallel",
+        )
+        parser.add_argument(
+            "--start-date",
+            type=datetime.date.fromisoformat,
+            help="Start of the period (YYYY-MM-DD, default: same as the dashboard, the previous month)",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=datetime.date.fromisoformat,
+            help="End of the period (YYYY-MM-DD, default: same as the dashboard, the previous month)",
+        )
+        parser.add_argument(
+            "--all-dates",
+            action="store_true",
+            help="Don't filter by date",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Also render the tiles that are already stored",
+        )
+
+    def handle(self, *args, **options) -> None:
+        store = default_tile_store()
+        if store is None:
+            raise CommandError("The tile store is disabled (TILE_STORE_PATH is None)")
+
+        if options["all_dates"]:
+            start_date, end_date = None, None
+        else:
+            default_start_date, default_end_date = previous_month()
+            start_date = options["start_date"] or default_start_date
+            end_date = options["end_date"] or default_end_date
+
+        data_version = current_data_version()
+        presets = filter_presets(start_date, end_date)
+        # Tiles are rendered by metatiles, like in the tile views
+        metatiles = sorted(
+            {
+                (zoom,) + metatile_origin(zoom, x, y, settings.TILE_METATILE_SIZE)
+                for zoom in range(options["min_zoom"], options["max_zoom"] + 1)
+                for x, y in tiles_in_bbox(zoom, BENELUX_BBOX)
+            }
+        )
+        self.stdout.write(
+            f"Seeding {len(metatiles)} metatiles x {len(presets)} filter presets x {len(options['layers'])} layers "
+            f"(data version: {data_version})"
+        )
+
+        def seed_metatile(
+            layer: str, filters: Dict[str, Any], zoom: int, x0: int, y0: int, size: int
+        ) -> int:
+            """Render and store the tiles of a metatile, return the number of stored tiles (0 if already stored)"""
+            try:
+                key = request_filters_key(filters)
+                tiles_coordinates = [
+                    (x, y) for x in range(x0, x0 + size) for y in range(y0, y0 + size)
+                ]
+                if not options["force"] and all(
+                    store.get(data_version, layer, zoom, x, y, key)
+                    for x, y in tiles_coordinates
+                ):
+                    return 0
+
+                tiles = LAYERS[layer](zoom, x0, y0, size, **filters)
+                for (x, y), content in tiles.items():
+                    data, etag = compress(content)
+                    store.put(data_version, layer, zoom, x, y, key, data, etag)
+                return len(tiles)
+            finally:
+                # The worker threads would otherwise each leave a database connection open
+                connection.close()
+
+        rendered_count, skipped_count = 0, 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = [
+                executor.submit(seed_metatile, layer, filters, zoom, x0, y0, size)
+                for layer in options["layers"]
+                for filters in presets
+                for zoom, x0, y0, size in metatiles
+            ]
+            for i, future in enumerate(futures, start=1):
+                stored_count = future.result()
+                if stored_count:
+                    rendered_count += stored_count
+                else:
+                    skipped_count += 1
+                if i % PROGRESS_EVERY == 0:
+                    self.stdout.write(f"{i}/{len(futures)} metatiles")
+
+        self.stdout.write(
+            f"Done: {rendered_count} tiles rendered, {skipped_count} metatiles already stored"
+        )
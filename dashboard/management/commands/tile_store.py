@@ -0,0 +1,54 @@
+from django.core.management import BaseCommand, CommandParser
+
+from dashboard.cache import current_data_version
+from dashboard.tile_store import default_tile_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Inspect or purge the persistent tile store. "
+        "Without option, shows the number and size of stored tiles per layer."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--purge",
+            action="store_true",
+            help="Delete the stored tiles",
+        )
+        parser.add_argument(
+            "--layer",
+            help="Only purge the tiles of this layer (default: all layers)",
+        )
+        parser.add_argument(
+            "--stale",
+            action="store_true",
+            help="Only purge the tiles of previous data versions",
+        )
+
+    def handle(self, *args, **options) -> None:
+        store = default_tile_store()
+        if store is None:
+            self.stdout.write("The tile store is disabled (TILE_STORE_PATH is None)")
+            return
+
+        if options["purge"]:
+            deleted_count = store.purge(
+                layer=options["layer"],
+                except_data_version=current_data_version()
+                if options["stale"]
+                else None,
+            )
+            self.stdout.write(f"{deleted_count} tiles deleted")
+            return
+
+        self.stdout.write(
+            f"Tile store: {store.path} (maximum size: {store.max_size_bytes} bytes)"
+        )
+        self.stdout.write(f"Current data version: {current_data_version()}")
+        total_count, total_size = 0, 0
+        for data_version, layer, count, size in store.stats():
+            self.stdout.write(f"[{data_version}] {layer}: {count} tiles, {size} bytes")
+            total_count += count
+            total_size += size
+        self.stdout.write(f"Total: {total_count} tiles, {total_size} bytes")
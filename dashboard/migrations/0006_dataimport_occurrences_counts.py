@@ -0,0 +1,36 @@
+# Generated by Django 3.2.18 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "dashboard",
+            "0005_biodiversityindicatorobservation_biodiversityindicatorspecies",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataimport",
+            name="deleted_occurrences_count",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="new_occurrences_count",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="unchanged_occurrences_count",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="updated_occurrences_count",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.18 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0006_dataimport_occurrences_counts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataimport",
+            name="peak_rss_kb",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="phase_durations",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="rows_imported_count",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="rows_per_second",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="rows_read_count",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="rows_skipped_count",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.18 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0007_dataimport_metrics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataimport",
+            name="checkpoint_imported_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="checkpoint_rows_offset",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dataimport",
+            name="source_dwca_path",
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 3.2.18 on 2026-10-18 11:27
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0008_dataimport_checkpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AreaBiodiversitySummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                (
+                    "species_group",
+                    models.CharField(
+                        choices=[
+                            ("PL", "Plants"),
+                            ("BI", "Birds"),
+                            ("OD", "Odonata"),
+                            ("OT", "Others"),
+                        ],
+                        max_length=2,
+                    ),
+                ),
+                ("observations_count", models.IntegerField()),
+                (
+                    "species_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.BigIntegerField(), size=None
+                    ),
+                ),
+                (
+                    "area",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dashboard.area",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("area", "year", "species_group")},
+            },
+        ),
+        # Summarize the observations already loaded (same as AreaBiodiversitySummary.refresh())
+        migrations.RunSQL(
+            """
+            INSERT INTO dashboard_areabiodiversitysummary (area_id, year, species_group, observations_count, species_ids)
+            SELECT
+                areas.id,
+                EXTRACT('year' FROM obs.date)::integer AS year,
+                species.species_group,
+                COUNT(DISTINCT obs.id),
+                ARRAY_AGG(DISTINCT species.id)
+            FROM dashboard_area areas
+            INNER JOIN dashboard_biodiversityindicatorobservation obs ON ST_Intersects(obs.location, areas.mpoly)
+            INNER JOIN dashboard_biodiversityindicatorspecies species ON obs.species_id = species.id
+            GROUP BY areas.id, year, species.species_group
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
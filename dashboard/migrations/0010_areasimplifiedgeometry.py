@@ -0,0 +1,57 @@
+# Generated by Django 3.2.18 on 2026-10-18 13:02
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0009_areabiodiversitysummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AreaSimplifiedGeometry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("min_zoom", models.IntegerField()),
+                (
+                    "mpoly",
+                    django.contrib.gis.db.models.fields.MultiPolygonField(srid=3857),
+                ),
+                (
+                    "area",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dashboard.area",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("area", "min_zoom")},
+            },
+        ),
+        # Simplify the existing areas (bands: minimum zoom, most detailed zoom - for a 1 pixel tolerance)
+        migrations.RunSQL(
+            """
+            INSERT INTO dashboard_areasimplifiedgeometry (area_id, min_zoom, mpoly)
+            SELECT
+                areas.id,
+                bands.min_zoom,
+                ST_Multi(ST_SimplifyPreserveTopology(areas.mpoly, 40075016.686 / (256 * 2 ^ bands.max_zoom)))
+            FROM dashboard_area areas
+            CROSS JOIN (VALUES (0, 5), (6, 8), (9, 11), (12, 14)) AS bands(min_zoom, max_zoom)
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.18 on 2026-10-18 14:21
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0010_areasimplifiedgeometry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AreaSubdivision",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "geom",
+                    django.contrib.gis.db.models.fields.GeometryField(srid=3857),
+                ),
+                (
+                    "area",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dashboard.area",
+                    ),
+                ),
+            ],
+        ),
+        # Subdivide the existing areas
+        migrations.RunSQL(
+            """
+            INSERT INTO dashboard_areasubdivision (area_id, geom)
+            SELECT areas.id, ST_Subdivide(areas.mpoly, 256) FROM dashboard_area areas
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.18 on 2026-10-18 15:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0011_areasubdivision"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReferenceDataLoad",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("AR", "Areas"),
+                            ("FI", "Fishnet"),
+                            ("BI", "Biodiversity indicators"),
+                        ],
+                        max_length=2,
+                    ),
+                ),
+                ("end", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
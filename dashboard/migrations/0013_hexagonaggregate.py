@@ -0,0 +1,73 @@
+# Generated by Django 3.2.18 on 2026-10-18 17:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0012_referencedataload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HexagonAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("zoom", models.SmallIntegerField()),
+                ("i", models.IntegerField()),
+                ("j", models.IntegerField()),
+                ("is_catch", models.BooleanField()),
+                ("date", models.DateField()),
+                ("occurrences_count", models.IntegerField()),
+                (
+                    "source_dataset",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dashboard.dataset",
+                    ),
+                ),
+                (
+                    "species",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dashboard.species",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="hexagonaggregate",
+            index=models.Index(
+                fields=["zoom", "date"], name="dashboard_h_zoom_7f1cbb_idx"
+            ),
+        ),
+        # Aggregate the existing occurrences (zoom levels and hexagon sizes of views.tileserver at the time of writing)
+        migrations.RunSQL(
+            """
+            INSERT INTO dashboard_hexagonaggregate
+                (zoom, i, j, species_id, source_dataset_id, is_catch, date, occurrences_count)
+            SELECT levels.zoom, hexes.i, hexes.j, occ.species_id, occ.source_dataset_id, occ.is_catch, occ.date, COUNT(*)
+            FROM (VALUES
+                (0, 1280000), (1, 640000), (2, 320000), (3, 160000), (4, 80000),
+                (5, 40000), (6, 20000), (7, 10000), (8, 5000), (9, 2500)
+            ) AS levels(zoom, hex_size)
+            CROSS JOIN LATERAL ST_HexagonGrid(
+                levels.hex_size,
+                (SELECT ST_SetSRID(ST_Extent(location), 3857) FROM dashboard_occurrence)
+            ) AS hexes
+            INNER JOIN dashboard_occurrence occ ON ST_Intersects(occ.location, hexes.geom)
+            GROUP BY levels.zoom, hexes.i, hexes.j, occ.species_id, occ.source_dataset_id, occ.is_catch, occ.date
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0013_hexagonaggregate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OccurrenceArea",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "area",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dashboard.area",
+                    ),
+                ),
+                (
+                    "occurrence",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        to="dashboard.occurrence",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("area", "occurrence")},
+            },
+        ),
+        # Memberships of the existing occurrences
+        migrations.RunSQL(
+            """
+            INSERT INTO dashboard_occurrencearea (occurrence_id, area_id)
+            SELECT DISTINCT occ.id, pieces.area_id
+            FROM dashboard_occurrence occ
+            INNER JOIN dashboard_areasubdivision pieces ON ST_Intersects(occ.location, pieces.geom)
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
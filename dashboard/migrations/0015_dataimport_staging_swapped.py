@@ -0,0 +1,18 @@
+# Generated by Django 3.2.18 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0014_occurrencearea"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataimport",
+            name="staging_swapped",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.18 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0015_dataimport_staging_swapped"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="referencedataload",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("AR", "Areas"),
+                    ("FI", "Fishnet"),
+                    ("BI", "Biodiversity indicators"),
+                    ("DN", "Dataset names"),
+                    ("AE", "Admin edits"),
+                ],
+                max_length=2,
+            ),
+        ),
+    ]
@@ -1,8 +1,28 @@
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Iterator, Callable
+
 from django.contrib.gis.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection, transaction
+from django.db.models import Case, When, Value
 from django.utils import timezone
 
 DATA_SRID = 3857
 
+# Simplified area geometries are precomputed for the following zoom bands, identified by their minimum zoom level. A band
+# is used up to the next band's minimum zoom level, the full resolution geometry (Area.mpoly) is used from
+# AREA_FULL_RESOLUTION_MIN_ZOOM
+AREA_SIMPLIFICATION_BANDS = [0, 6, 9, 12]
+AREA_FULL_RESOLUTION_MIN_ZOOM = 15
+WEB_MERCATOR_WORLD_WIDTH = 40075016.686  # in meters
+TILE_SIZE_PIXELS = 256
+
+# Maximum number of vertices of the area pieces used for point-in-area filtering (see AreaSubdivision)
+AREA_SUBDIVISION_MAX_VERTICES = 256
+
+# Temporary table of the occurrences changed outside of the imports, see updating_occurrence_derived_tables()
+OCCURRENCE_EDITS_TABLE_NAME = "occurrences_edits"
+
 
 class Species(models.Model):
     name = models.CharField(max_length=255, db_index=True)
@@ -19,6 +39,86 @@ class DataImport(models.Model):
         blank=True, null=True
     )  # Null if a DwC-A file was provided - no GBIF download
 
+    # Occurrences counts, per category. Updated/unchanged are only known for delta imports
+    new_occurrences_count = models.IntegerField(blank=True, null=True)
+    updated_occurrences_count = models.IntegerField(blank=True, null=True)
+    deleted_occurrences_count = models.IntegerField(blank=True, null=True)
+    unchanged_occurrences_count = models.IntegerField(blank=True, null=True)
+
+    # Checkpoint, for imports that can be resumed (--zero-downtime): absolute path of the archive, number of archive
+    # rows processed (and of occurrences imported) in the batches committed so far, and whether the staging tables
+    # already replaced the live ones (only the final steps are left)
+    source_dwca_path = models.CharField(max_length=1024, blank=True)
+    checkpoint_rows_offset = models.IntegerField(default=0)
+    checkpoint_imported_count = models.IntegerField(default=0)
+    staging_swapped = models.BooleanField(default=False)
+
+    # Performance metrics, to spot regressions between imports
+    phase_durations = models.JSONField(
+        blank=True, null=True
+    )  # Phase name -> duration in seconds
+    rows_read_count = models.IntegerField(blank=True, null=True)
+    rows_skipped_count = models.IntegerField(blank=True, null=True)
+    rows_imported_count = models.IntegerField(blank=True, null=True)
+    rows_per_second = models.FloatField(blank=True, null=True)
+    peak_rss_kb = models.IntegerField(blank=True, null=True)
+
+    def set_occurrences_counts(
+        self,
+        new: int,
+        deleted: int,
+        updated: Optional[int] = None,
+        unchanged: Optional[int] = None,
+    ) -> None:
+        """Set the occurrences counts (doesn't save the entry)"""
+        self.new_occurrences_count = new
+        self.deleted_occurrences_count = deleted
+        self.updated_occurrences_count = updated
+        self.unchanged_occurrences_count = unchanged
+
+    def set_metrics(
+        self,
+        phase_durations: Dict[str, float],
+        rows_read: int,
+        rows_imported: int,
+        peak_rss_kb: int,
+    ) -> None:
+        """Set the performance metrics of the import and immediately save the entry
+
+        rows_per_second is computed over the reading, parsing and writing phases."""
+        self.phase_durations = phase_durations
+        self.rows_read_count = rows_read
+        self.rows_skipped_count = rows_read - rows_imported
+        self.rows_imported_count = rows_imported
+        self.peak_rss_kb = peak_rss_kb
+
+        processing_time = phase_durations.get(
+            "read_and_parse", 0.0
+        ) + phase_durations.get("write", 0.0)
+        self.rows_per_second = rows_read / processing_time if processing_time else None
+        self.save()
+
+    def save_checkpoint(self, rows_offset: int, imported_count: int) -> None:
+        """Save the position reached in the archive (to be called in the transaction that writes the data)"""
+        self.checkpoint_rows_offset = rows_offset
+        self.checkpoint_imported_count = imported_count
+        self.save(update_fields=["checkpoint_rows_offset", "checkpoint_imported_count"])
+
+    def save_staging_swapped(self, new: int, deleted: int) -> None:
+        """Record that the staging tables replaced the live ones, with the occurrences counts (to be called in the
+        transaction of the swap)"""
+        self.staging_swapped = True
+        self.set_occurrences_counts(new=new, deleted=deleted)
+        self.save(
+            update_fields=[
+                "staging_swapped",
+                "new_occurrences_count",
+                "deleted_occurrences_count",
+                "updated_occurrences_count",
+                "unchanged_occurrences_count",
+            ]
+        )
+
     def set_gbif_download_id(self, download_id: str) -> None:
         """Set the download id and immediately save the entry"""
         self.gbif_download_id = download_id
@@ -30,6 +130,35 @@ class DataImport(models.Model):
         self.save()
 
 
+class ReferenceDataLoad(models.Model):
+    """A (re)load of reference data (areas, fishnet squares or biodiversity indicators), or another change of the data
+    outside of the occurrences imports (dataset names fix, edits in the admin)
+
+    Together with DataImport, allows to know when the data served by the application has changed."""
+
+    AREAS = "AR"
+    FISHNET = "FI"
+    BIODIVERSITY_INDICATORS = "BI"
+    DATASET_NAMES = "DN"
+    ADMIN_EDITS = "AE"
+
+    KIND_CHOICES = [
+        (AREAS, "Areas"),
+        (FISHNET, "Fishnet"),
+        (BIODIVERSITY_INDICATORS, "Biodiversity indicators"),
+        (DATASET_NAMES, "Dataset names"),
+        (ADMIN_EDITS, "Admin edits"),
+    ]
+
+    kind = models.CharField(max_length=2, choices=KIND_CHOICES)
+    end = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def record(cls, kind: str) -> None:
+        """To be called after each (re)load of reference data of this kind"""
+        cls.objects.create(kind=kind)
+
+
 class Dataset(models.Model):
     name = models.CharField(max_length=255, db_index=True)
     gbif_id = models.CharField(max_length=255, unique=True)
@@ -80,6 +209,105 @@ class Occurrence(models.Model):
         return d
 
 
+class HexagonAggregate(models.Model):
+    """Occurrences counts per hexagon (of the map grid at a given zoom level), species, dataset, type and date
+
+    Allows computing grid statistics (min/max occurrences per hexagon) without joining all occurrences to the grid.
+    Rebuilt after each import (see refresh()), or updated for the changed occurrences only (see apply_changes())."""
+
+    zoom = models.SmallIntegerField()
+    # Hexagon coordinates, as returned by ST_HexagonGrid (the grid is aligned on the origin, not on its bounds)
+    i = models.IntegerField()
+    j = models.IntegerField()
+    species = models.ForeignKey(Species, on_delete=models.CASCADE)
+    source_dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE)
+    is_catch = models.BooleanField()
+    date = models.DateField()
+    occurrences_count = models.IntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["zoom", "date"])]
+
+    @classmethod
+    def refresh(cls, hex_sizes: Dict[int, int]) -> None:
+        """Rebuild the whole table, hex_sizes: zoom level -> hexagon size (in meters) at this zoom level"""
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Not TRUNCATE: it would block the readers until the end of the transaction
+            cursor.execute(f"DELETE FROM {cls._meta.db_table}")
+            cls.insert_aggregates(
+                cursor, hex_sizes, Occurrence._meta.db_table, cls._meta.db_table
+            )
+            cursor.execute(f"ANALYZE {cls._meta.db_table}")
+
+    @staticmethod
+    def insert_aggregates(
+        cursor, hex_sizes: Dict[int, int], occurrences_table_name: str, table_name: str
+    ) -> None:
+        """Insert in table_name the aggregates of the occurrences of occurrences_table_name (see refresh())"""
+        for zoom, hex_size in hex_sizes.items():
+            cursor.execute(
+                f"""
+                INSERT INTO {table_name}
+                    (zoom, i, j, species_id, source_dataset_id, is_catch, date, occurrences_count)
+                SELECT %s, hexes.i, hexes.j, occ.species_id, occ.source_dataset_id, occ.is_catch, occ.date, COUNT(*)
+                FROM ST_HexagonGrid(
+                    %s,
+                    (SELECT ST_SetSRID(ST_Extent(location), {DATA_SRID}) FROM {occurrences_table_name})
+                ) AS hexes
+                INNER JOIN {occurrences_table_name} occ ON ST_Intersects(occ.location, hexes.geom)
+                GROUP BY hexes.i, hexes.j, occ.species_id, occ.source_dataset_id, occ.is_catch, occ.date
+                """,
+                [zoom, hex_size],
+            )
+
+    @classmethod
+    def apply_changes(cls, hex_sizes: Dict[int, int], changes_table_name: str) -> None:
+        """Update the aggregates after some occurrences changed, instead of rebuilding the whole table
+
+        changes_table_name has the location, species_id, source_dataset_id, is_catch and date of the changed occurrences,
+        and a sign column: -1 for the previous values of the deleted and updated occurrences, 1 for the new values of the
+        updated and new occurrences."""
+        table_name = cls._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            for zoom, hex_size in hex_sizes.items():
+                # The grid is aligned on the origin: the hexagons (i, j) of the changed area are those of the full grid
+                cursor.execute(
+                    f"""
+                    WITH changes AS (
+                        SELECT hexes.i, hexes.j, c.species_id, c.source_dataset_id, c.is_catch, c.date,
+                            SUM(c.sign) AS count
+                        FROM ST_HexagonGrid(
+                            %s,
+                            (SELECT ST_SetSRID(ST_Extent(location), {DATA_SRID}) FROM {changes_table_name})
+                        ) AS hexes
+                        INNER JOIN {changes_table_name} c ON ST_Intersects(c.location, hexes.geom)
+                        GROUP BY hexes.i, hexes.j, c.species_id, c.source_dataset_id, c.is_catch, c.date
+                        HAVING SUM(c.sign) != 0
+                    ), updated AS (
+                        UPDATE {table_name} agg SET occurrences_count = agg.occurrences_count + changes.count
+                        FROM changes
+                        WHERE agg.zoom = %s AND agg.i = changes.i AND agg.j = changes.j
+                        AND agg.species_id = changes.species_id AND agg.source_dataset_id = changes.source_dataset_id
+                        AND agg.is_catch = changes.is_catch AND agg.date = changes.date
+                        RETURNING agg.i, agg.j, agg.species_id, agg.source_dataset_id, agg.is_catch, agg.date
+                    )
+                    INSERT INTO {table_name}
+                        (zoom, i, j, species_id, source_dataset_id, is_catch, date, occurrences_count)
+                    SELECT %s, i, j, species_id, source_dataset_id, is_catch, date, count FROM changes
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM updated
+                        WHERE updated.i = changes.i AND updated.j = changes.j
+                        AND updated.species_id = changes.species_id
+                        AND updated.source_dataset_id = changes.source_dataset_id
+                        AND updated.is_catch = changes.is_catch AND updated.date = changes.date
+                    )
+                    """,
+                    [hex_size, zoom, zoom],
+                )
+            cursor.execute(f"DELETE FROM {table_name} WHERE occurrences_count <= 0")
+            cursor.execute(f"ANALYZE {table_name}")
+
+
 class Area(models.Model):
     """An area that can be shown to the user, or used to filter observations"""
 
@@ -104,6 +332,172 @@ class Area(models.Model):
         return d
 
 
+def area_simplification_band(zoom: int) -> Optional[int]:
+    """Return the simplification band to use at this zoom level (None means full resolution)"""
+    if zoom >= AREA_FULL_RESOLUTION_MIN_ZOOM:
+        return None
+    return max(band for band in AREA_SIMPLIFICATION_BANDS if band <= zoom)
+
+
+def area_zoom_band(zoom: int) -> int:
+    """Minimum zoom level of the band of this zoom level (AREA_FULL_RESOLUTION_MIN_ZOOM for full resolution): all the
+    zoom levels of a band get the same area geometry"""
+    band = area_simplification_band(zoom)
+    return AREA_FULL_RESOLUTION_MIN_ZOOM if band is None else band
+
+
+def area_simplification_tolerance(band: int) -> float:
+    """Simplification tolerance (in meters) for a band: about one pixel at the most detailed zoom level of the band"""
+    bands_limits = AREA_SIMPLIFICATION_BANDS + [AREA_FULL_RESOLUTION_MIN_ZOOM]
+    max_zoom = bands_limits[bands_limits.index(band) + 1] - 1
+    return WEB_MERCATOR_WORLD_WIDTH / (TILE_SIZE_PIXELS * 2**max_zoom)
+
+
+class AreaSimplifiedGeometry(models.Model):
+    """A simplified version of an area geometry, for a given zoom band (see AREA_SIMPLIFICATION_BANDS)"""
+
+    area = models.ForeignKey(Area, on_delete=models.CASCADE)
+    min_zoom = models.IntegerField()
+    mpoly = models.MultiPolygonField(srid=DATA_SRID)
+
+    class Meta:
+        unique_together = ("area", "min_zoom")
+
+    @classmethod
+    def refresh(cls, area_ids: Optional[List[int]] = None) -> None:
+        """Rebuild the simplified geometries of the given areas (all areas if None)"""
+        bands = AREA_SIMPLIFICATION_BANDS
+        tolerances = [area_simplification_tolerance(band) for band in bands]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if area_ids is None:
+                cursor.execute(f"DELETE FROM {cls._meta.db_table}")
+            else:
+                cursor.execute(
+                    f"DELETE FROM {cls._meta.db_table} WHERE area_id = ANY(%s)",
+                    [area_ids],
+                )
+            cursor.execute(
+                f"""
+                INSERT INTO {cls._meta.db_table} (area_id, min_zoom, mpoly)
+                SELECT areas.id, bands.min_zoom, ST_Multi(ST_SimplifyPreserveTopology(areas.mpoly, bands.tolerance))
+                FROM {Area._meta.db_table} areas
+                CROSS JOIN unnest(%s::integer[], %s::double precision[]) AS bands(min_zoom, tolerance)
+                WHERE %s::bigint[] IS NULL OR areas.id = ANY(%s::bigint[])
+                """,
+                [bands, tolerances, area_ids, area_ids],
+            )
+
+
+class AreaSubdivision(models.Model):
+    """A small piece of an area (ST_Subdivide), to quickly test if a point is in an area
+
+    The bounding box index is much more selective on those pieces than on the complete (large, with many vertices)
+    area geometry. A point is in an area if it intersects one of its pieces."""
+
+    area = models.ForeignKey(Area, on_delete=models.CASCADE)
+    geom = models.GeometryField(srid=DATA_SRID)
+
+    @classmethod
+    def refresh(cls, area_ids: Optional[List[int]] = None) -> None:
+        """Rebuild the pieces of the given areas (all areas if None)"""
+        with transaction.atomic(), connection.cursor() as cursor:
+            if area_ids is None:
+                cursor.execute(f"DELETE FROM {cls._meta.db_table}")
+            else:
+                cursor.execute(
+                    f"DELETE FROM {cls._meta.db_table} WHERE area_id = ANY(%s)",
+                    [area_ids],
+                )
+            cursor.execute(
+                f"""
+                INSERT INTO {cls._meta.db_table} (area_id, geom)
+                SELECT areas.id, ST_Subdivide(areas.mpoly, %s)
+                FROM {Area._meta.db_table} areas
+                WHERE %s::bigint[] IS NULL OR areas.id = ANY(%s::bigint[])
+                """,
+                [AREA_SUBDIVISION_MAX_VERTICES, area_ids, area_ids],
+            )
+            cursor.execute(f"ANALYZE {cls._meta.db_table}")
+
+
+class OccurrenceArea(models.Model):
+    """Membership of an occurrence in an area (its location intersects the area)
+
+    Precomputed (see refresh()) so that filtering the occurrences by area is an integer semi-join, without any geometry
+    operation at query time. Rebuilt after each occurrences import (or updated for the changed occurrences, see
+    apply_changes()) and each change of the areas."""
+
+    # No database constraint: the occurrence table can be replaced by another one (see import_all_observations
+    # --zero-downtime), the memberships are then rebuilt
+    occurrence = models.ForeignKey(
+        Occurrence, on_delete=models.DO_NOTHING, db_constraint=False
+    )
+    area = models.ForeignKey(Area, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ("area", "occurrence")
+
+    @classmethod
+    def refresh(cls, area_ids: Optional[List[int]] = None) -> None:
+        """Rebuild the memberships of the given areas (all areas if None). Relies on the area subdivisions."""
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Not TRUNCATE, even for all areas: it would block the area filter until the end of the transaction
+            cursor.execute(
+                f"DELETE FROM {cls._meta.db_table} WHERE %s::bigint[] IS NULL OR area_id = ANY(%s::bigint[])",
+                [area_ids, area_ids],
+            )
+            cls.insert_memberships(
+                cursor, Occurrence._meta.db_table, cls._meta.db_table, area_ids
+            )
+            cursor.execute(f"ANALYZE {cls._meta.db_table}")
+
+    @classmethod
+    def apply_changes(cls, changes_table_name: str) -> None:
+        """Update the memberships after some occurrences changed, instead of rebuilding them all
+
+        changes_table_name has the id of the changed occurrences, and a sign column: -1 for the deleted and updated
+        occurrences, 1 for the updated and new ones (see HexagonAggregate.apply_changes())."""
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {cls._meta.db_table} WHERE occurrence_id IN "
+                f"(SELECT id FROM {changes_table_name} WHERE sign < 0)"
+            )
+            cls.insert_memberships(
+                cursor,
+                Occurrence._meta.db_table,
+                cls._meta.db_table,
+                changes_table_name=changes_table_name,
+            )
+            cursor.execute(f"ANALYZE {cls._meta.db_table}")
+
+    @staticmethod
+    def insert_memberships(
+        cursor,
+        occurrences_table_name: str,
+        table_name: str,
+        area_ids: Optional[List[int]] = None,
+        changes_table_name: Optional[str] = None,
+    ) -> None:
+        """Insert in table_name the memberships of the occurrences of occurrences_table_name, for the given areas (all
+        areas if None). Only for the new values of the changed occurrences if changes_table_name is set."""
+        changed_only = ""
+        if changes_table_name is not None:
+            changed_only = (
+                f"AND occ.id IN (SELECT id FROM {changes_table_name} WHERE sign > 0)"
+            )
+        cursor.execute(
+            f"""
+            INSERT INTO {table_name} (occurrence_id, area_id)
+            SELECT DISTINCT occ.id, pieces.area_id
+            FROM {occurrences_table_name} occ
+            INNER JOIN {AreaSubdivision._meta.db_table} pieces ON ST_Intersects(occ.location, pieces.geom)
+            WHERE (%s::bigint[] IS NULL OR pieces.area_id = ANY(%s::bigint[])) {changed_only}
+            """,
+            [area_ids, area_ids],
+        )
+
+
 class FishnetSquare(models.Model):
     """A square of the fishnet grid"""
 
@@ -144,9 +538,113 @@ class BiodiversityIndicatorSpecies(models.Model):
         else:
             self.species_group = self.OTHERS
 
+    @classmethod
+    def auto_set_all_species_groups(cls):
+        """Same rules as auto_set_species_group(), for all species at once (single UPDATE query)"""
+        cls.objects.update(
+            species_group=Case(
+                When(s_kingdom="Plantae", then=Value(cls.PLANTS)),
+                When(s_class="Aves", then=Value(cls.BIRDS)),
+                When(s_order="Odonata", then=Value(cls.ODONATA)),
+                default=Value(cls.OTHERS),
+            )
+        )
+
 
 class BiodiversityIndicatorObservation(models.Model):
     gbif_id = models.CharField(max_length=255)
     species = models.ForeignKey(BiodiversityIndicatorSpecies, on_delete=models.PROTECT)
     date = models.DateField()
     location = models.PointField(blank=True, null=True, srid=DATA_SRID)
+
+
+class AreaBiodiversitySummary(models.Model):
+    """Biodiversity indicator observations summarized per area, year and species group.
+
+    Precomputed (see refresh()) so the richness map doesn't have to test every observation against every area.
+    """
+
+    area = models.ForeignKey(Area, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    species_group = models.CharField(
+        max_length=2, choices=BiodiversityIndicatorSpecies.SPECIES_GROUP_CHOICES
+    )
+    observations_count = models.IntegerField()
+    species_ids = ArrayField(models.BigIntegerField())  # Distinct species observed
+
+    class Meta:
+        unique_together = ("area", "year", "species_group")
+
+    @classmethod
+    def refresh(cls, area_ids: Optional[List[int]] = None) -> None:
+        """Rebuild the summary of the given areas (all areas if None).
+
+        To be called after areas or biodiversity observations are (re)loaded. Relies on the area subdivisions."""
+        with transaction.atomic(), connection.cursor() as cursor:
+            if area_ids is None:
+                cursor.execute(f"DELETE FROM {cls._meta.db_table}")
+            else:
+                cursor.execute(
+                    f"DELETE FROM {cls._meta.db_table} WHERE area_id = ANY(%s)",
+                    [area_ids],
+                )
+            cursor.execute(
+                f"""
+                INSERT INTO {cls._meta.db_table} (area_id, year, species_group, observations_count, species_ids)
+                SELECT
+                    pieces.area_id,
+                    EXTRACT('year' FROM obs.date)::integer AS year,
+                    species.species_group,
+                    COUNT(DISTINCT obs.id),
+                    ARRAY_AGG(DISTINCT species.id)
+                FROM {AreaSubdivision._meta.db_table} pieces
+                INNER JOIN {BiodiversityIndicatorObservation._meta.db_table} obs
+                    ON ST_Intersects(obs.location, pieces.geom)
+                INNER JOIN {BiodiversityIndicatorSpecies._meta.db_table} species
+                    ON obs.species_id = species.id
+                WHERE %s::bigint[] IS NULL OR pieces.area_id = ANY(%s::bigint[])
+                GROUP BY pieces.area_id, year, species.species_group
+                """,
+                [area_ids, area_ids],
+            )
+
+
+def refresh_area_derived_tables(area_ids: Optional[List[int]] = None) -> None:
+    """Rebuild all tables derived from the Area geometries, for the given areas (all areas if None).
+
+    To be called each time areas are created or modified (load_area, admin, ...)"""
+    AreaSimplifiedGeometry.refresh(area_ids)
+    AreaSubdivision.refresh(area_ids)
+    OccurrenceArea.refresh(area_ids)
+    AreaBiodiversitySummary.refresh(area_ids)
+    ReferenceDataLoad.record(ReferenceDataLoad.AREAS)
+
+
+@contextmanager
+def updating_occurrence_derived_tables(
+    occurrence_ids: Callable[[], List[int]], hex_sizes: Dict[int, int]
+) -> Iterator[None]:
+    """Context manager: update the tables derived from the occurrences (HexagonAggregate, OccurrenceArea) after some
+    occurrences are created, modified or deleted in the enclosed block (e.g. in the admin)
+
+    occurrence_ids is called when entering the block (to record the previous values of the occurrences) and when
+    leaving it (new values): it can return the id of an occurrence created in the block.
+    hex_sizes: see HexagonAggregate.refresh()."""
+    occurrences_table_name = Occurrence._meta.db_table
+    columns = "id, location, species_id, source_dataset_id, is_catch, date"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {OCCURRENCE_EDITS_TABLE_NAME} ON COMMIT DROP AS "
+            f"SELECT {columns}, -1 AS sign FROM {occurrences_table_name} WHERE id = ANY(%s::bigint[])",
+            [occurrence_ids()],
+        )
+        yield
+        cursor.execute(
+            f"INSERT INTO {OCCURRENCE_EDITS_TABLE_NAME} "
+            f"SELECT {columns}, 1 FROM {occurrences_table_name} WHERE id = ANY(%s::bigint[])",
+            [occurrence_ids()],
+        )
+        HexagonAggregate.apply_changes(hex_sizes, OCCURRENCE_EDITS_TABLE_NAME)
+        OccurrenceArea.apply_changes(OCCURRENCE_EDITS_TABLE_NAME)
+        # Several edits can be made in the same transaction
+        cursor.execute(f"DROP TABLE {OCCURRENCE_EDITS_TABLE_NAME}")
@@ -0,0 +1,94 @@
+"""Server-side prepared statements for the tile server queries (settings.TILE_PREPARED_STATEMENTS).
+
+A tile query rendered by JinjaSql always has the same text for a given filter shape (which filters are set, how many
+areas are selected...): it is prepared once per database connection (PREPARE), then each request only binds the
+parameters (EXECUTE), skipping the parsing and - once PostgreSQL switches to a generic plan - the planning of these
+large spatial queries. Database connections must be persistent (CONN_MAX_AGE) for this to pay off.
+"""
+import hashlib
+import re
+from typing import Sequence, Union, Mapping, List, Tuple
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# When a connection has more prepared statements (e.g. many combinations of selected areas), they are all deallocated
+MAX_PREPARED_STATEMENTS_PER_CONNECTION = 200
+
+# Placeholders of the "format" (%s: JinjaSql's default) and "pyformat" (%(name)s) parameter styles, and escaped
+# percent signs
+_FORMAT_PLACEHOLDER = re.compile(r"%(?:\((\w+)\))?([s%])")
+
+
+def statement_name(query: str) -> str:
+    """Name of the prepared statement for this query (derived from its text)"""
+    return "mica_" + hashlib.sha1(query.encode("utf-8")).hexdigest()[:20]
+
+
+def _numeric_placeholders(query: str) -> Tuple[str, List[str]]:
+    """Convert the placeholders of the query to PostgreSQL's $1, $2...
+
+    Also return the parameter names (pyformat style), in the order of their numbers."""
+    numbers = {}  # Parameter name -> number
+    count = 0
+
+    def replace(match: re.Match) -> str:
+        nonlocal count
+        name, conversion = match.groups()
+        if conversion == "%":
+            return "%"
+        if name is None:  # %s: each placeholder is a new parameter
+            count += 1
+            return f"${count}"
+        # %(name)s: a parameter used several times keeps its number
+        if name not in numbers:
+            count += 1
+            numbers[name] = count
+        return f"${numbers[name]}"
+
+    return _FORMAT_PLACEHOLDER.sub(replace, query), list(numbers)
+
+
+def to_numeric_placeholders(query: str) -> str:
+    """Convert a query with %s (or %(name)s) placeholders to PostgreSQL's $1, $2..."""
+    return _numeric_placeholders(query)[0]
+
+
+@receiver(connection_created)
+def reset_prepared_statements(sender, connection, **kwargs) -> None:
+    """A new database connection has no prepared statements"""
+    connection.prepared_statements = set()
+
+
+def execute_prepared(
+    cursor, query: str, bind_params: Union[Sequence, Mapping[str, object]]
+) -> None:
+    """Execute the query (with %s placeholders, or %(name)s and a mapping of parameters) on this Django cursor, as a
+    prepared statement of its connection
+
+    The statement is prepared on the first execution of this query on the connection."""
+    if not settings.TILE_PREPARED_STATEMENTS:
+        cursor.execute(query, bind_params)
+        return
+
+    # Connections opened before this module was imported (no connection_created signal received) have no statements
+    if not hasattr(cursor.db, "prepared_statements"):
+        cursor.db.prepared_statements = set()
+    prepared = cursor.db.prepared_statements
+
+    name = statement_name(query)
+    if name not in prepared:
+        if len(prepared) >= MAX_PREPARED_STATEMENTS_PER_CONNECTION:
+            cursor.execute("DEALLOCATE ALL")
+            prepared.clear()
+        cursor.execute(f"PREPARE {name} AS {to_numeric_placeholders(query)}")
+        prepared.add(name)
+
+    if isinstance(bind_params, Mapping):
+        bind_params = [bind_params[n] for n in _numeric_placeholders(query)[1]]
+    if bind_params:
+        placeholders = ", ".join(["%s"] * len(bind_params))
+        cursor.execute(f"EXECUTE {name} ({placeholders})", bind_params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
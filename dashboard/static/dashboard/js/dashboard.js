@@ -574,11 +574,13 @@ Vue.component('dashboard-map', {
         'initialZoom': Number,
 
         'filters': Object, // For filtering occurrence data
+        'availableDatasets': Array, // To look up the names of the datasets of the occurrences (tiles only have their ids)
 
         'dataLayerOpacity': Number,
 
         'overlayServerUrl': String,
         'overlayId': null,
+        'areaZoomBands': Array, // Minimum zoom level of each level of detail of the area overlay geometry
 
         'showBiodiversityRichness': Boolean,
         'selectedYearsRichness': Array,
@@ -590,6 +592,7 @@ Vue.component('dashboard-map', {
             map: null,
             vectorSource: new ol.source.Vector(),
             areasOverlayCollection: new ol.Collection(),
+            areasOverlayZoomBand: null, // Zoom band of the currently displayed area overlay (its geometry is simplified accordingly)
             HexMinOccCount: 1,
             HexMaxOccCount: 1,
 
@@ -664,6 +667,9 @@ Vue.component('dashboard-map', {
 
     },
     computed: {
+        datasetNamesById: function () {
+            return Object.fromEntries(this.availableDatasets.map((d) => [d.id, d.name]));
+        },
         colorScaleOccurrences: function () {
             return d3.scaleSequentialLog(d3.interpolateBlues)
                 .domain([this.HexMinOccCount, this.HexMaxOccCount])
@@ -747,6 +753,20 @@ Vue.component('dashboard-map', {
         simpleOccurrencesVectorTilesLayerStyleFunction: function () {
             let vm = this
             return function (feature) {
+                const count = feature.properties_.count;
+                if (count > 1) {
+                    // Cluster of occurrences (dense tiles are thinned by the tile server)
+                    return new ol.style.Style({
+                        image: new ol.style.Circle({
+                            radius: 11,
+                            fill: new ol.style.Fill({color: vm.addOpacityToColor(d3.color("#242d66"))})
+                        }),
+                        text: new ol.style.Text({
+                            text: count.toString(),
+                            fill: new ol.style.Fill({color: vm.addOpacityToColor(d3.color("white"))})
+                        })
+                    });
+                }
                 return new ol.style.Style({
                     image: new ol.style.Circle({
                         radius: 7,
@@ -946,11 +966,20 @@ Vue.component('dashboard-map', {
                 }),
             });
         },
+        areasZoomBand: function (zoom) {
+            // Bands are sorted, the first one starts at zoom level 0
+            return Math.max(...this.areaZoomBands.filter(band => band <= zoom));
+        },
+        currentAreasZoomBand: function () {
+            return this.areasZoomBand(this.map ? Math.round(this.map.getView().getZoom()) : this.initialZoom);
+        },
         refreshAreas: function () {
             let vm = this;
-            this.areasOverlayCollection.clear();
-            if (this.overlayId !== null) {
-                $.ajax(this.overlayServerUrl.replace('{id}', this.overlayId.toString()))
+            this.areasOverlayZoomBand = this.currentAreasZoomBand();
+            if (this.overlayId === null) {
+                this.areasOverlayCollection.clear();
+            } else {
+                $.ajax(this.overlayServerUrl.replace('{id}', this.overlayId.toString()), {data: {zoom: this.areasOverlayZoomBand}})
                     .done(function (data) {
                         const vectorSource = new ol.source.Vector({
                             features: new ol.format.GeoJSON().readFeatures(data, {
@@ -970,6 +999,7 @@ Vue.component('dashboard-map', {
                             zIndex: 3
                         });
 
+                        vm.areasOverlayCollection.clear(); // Replaced only now, to avoid flickering
                         vm.areasOverlayCollection.push(vectorLayer);
                     })
             }
@@ -985,6 +1015,13 @@ Vue.component('dashboard-map', {
         this.popup.setElement(this.$refs["popup-root"]);
         this.map.addOverlay(this.popup);
 
+        this.map.on('moveend', evt => {
+            // Reload the area overlay when another level of detail is needed
+            if (this.overlayId !== null && this.currentAreasZoomBand() !== this.areasOverlayZoomBand) {
+                this.refreshAreas();
+            }
+        });
+
         this.map.on('click', evt => {
             // Hide previously opened
             if (this.popover !== null) {
@@ -1000,12 +1037,18 @@ Vue.component('dashboard-map', {
                         gbifId: properties["gbif_id"],
                         url: "https://www.gbif.org/occurrence/" + properties["gbif_id"],
                         individualCount: properties["individual_count"],
-                        datasetName: properties["dataset_name"],
+                        // Tiles have either the dataset id (compact attributes) or its name
+                        datasetName: properties["dataset_id"] !== undefined ? this.datasetNamesById[properties["dataset_id"]] : properties["dataset_name"],
+                        count: properties["count"], // > 1 for a cluster: the other properties are those of one of its occurrences
                     };
                 });
 
                 const clickedFeaturesHtmlList = clickedFeaturesData.map((f) => {
-                    return '<li><a href="' + f.url + '" target="_blank">' + f.gbifId + '</a> (<b>individual count:</b></b> ' + f.individualCount + ' ' + '<b>dataset:</b> ' + f.datasetName + ')</li>';
+                    const occurrenceHtml = '<a href="' + f.url + '" target="_blank">' + f.gbifId + '</a> (<b>individual count:</b></b> ' + f.individualCount + ' ' + '<b>dataset:</b> ' + f.datasetName + ')';
+                    if (f.count > 1) {
+                        return '<li><b>' + f.count + ' occurrences</b> around here (zoom in to see them), e.g. ' + occurrenceHtml + '</li>';
+                    }
+                    return '<li>' + occurrenceHtml + '</li>';
                 });
 
 
@@ -1,3 +1,480 @@
-from django.test import TestCase
+import os
+import sqlite3
+import tempfile
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.http import QueryDict
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from dwca.read import DwCAReader
+
+from dashboard import prepared_statements, tile_store
+from dashboard.cache import compress, filters_key, precompressed_response
+from dashboard.management.commands import import_all_observations
+from dashboard.management.commands._helpers import (
+    DatasetNamesCache,
+    StreamingDwCAReader,
+    iter_rows_values,
+)
+
+GBIF_ID = "http://rs.gbif.org/terms/1.0/gbifID"
+DATASET_KEY = "http://rs.gbif.org/terms/1.0/datasetKey"
+DATASET_NAME = "http://rs.tdwg.org/dwc/terms/datasetName"
+YEAR = "http://rs.tdwg.org/dwc/terms/year"
+MUNICIPALITY = "http://rs.tdwg.org/dwc/terms/municipality"  # Not in the archive
+
+META_XML = f"""<?xml version="1.0" encoding="utf-8"?>
+<archive xmlns="http://rs.tdwg.org/dwc/text/" metadata="metadata.xml">
+  <core encoding="utf-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" fieldsEnclosedBy="{{fields_enclosed_by}}"
+        ignoreHeaderLines="1"
+        rowType="http://rs.tdwg.org/dwc/terms/Occurrence">
+    <files><location>occurrence.txt</location></files>
+    <id index="0" />
+    <field index="0" term="{GBIF_ID}"/>
+    <field index="1" term="{DATASET_KEY}"/>
+    <field index="2" term="{YEAR}"/>
+    <field term="{DATASET_NAME}" default="Default dataset name"/>
+  </core>
+</archive>
+"""
+METADATA_XML = """<?xml version="1.0" encoding="utf-8"?>
+<eml:eml xmlns:eml="eml://ecoinformatics.org/eml-2.1.1" packageId="test" system="http://gbif.org">
+  <dataset><alternateIdentifier>0000000-000000000000000</alternateIdentifier><title>Test</title></dataset>
+</eml:eml>
+"""
+OCCURRENCE_ROWS = [
+    "gbifID\tdatasetKey\tyear",
+    "1\tdataset-a\t2021",
+    "2\tdataset-a\t",
+    "3\tdataset-b\t2022",
+]
+
+
+class StreamingDwCAReaderTests(SimpleTestCase):
+    terms = [GBIF_ID, DATASET_KEY, DATASET_NAME, YEAR, MUNICIPALITY]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def build_archive(self, occurrence_lines, fields_enclosed_by="") -> str:
+        path = os.path.join(
+            self.tmp_dir.name, f"archive_{len(os.listdir(self.tmp_dir.name))}.zip"
+        )
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr(
+                "meta.xml", META_XML.format(fields_enclosed_by=fields_enclosed_by)
+            )
+            archive.writestr("metadata.xml", METADATA_XML)
+            archive.writestr("occurrence.txt", "\n".join(occurrence_lines) + "\n")
+        return path
+
+    def test_same_rows_as_dwcareader(self):
+        path = self.build_archive(OCCURRENCE_ROWS)
+        with DwCAReader(path) as dwca:
+            expected = list(iter_rows_values(dwca, self.terms))
+        with StreamingDwCAReader(path) as dwca:
+            rows = list(iter_rows_values(dwca, self.terms))
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows, expected)
+        self.assertEqual(rows[1], ("2", "dataset-a", "Default dataset name", "", ""))
+
+    def test_blank_lines_are_skipped(self):
+        # Both parsing paths: fast path (no quoting) and csv.reader
+        for fields_enclosed_by in ["", "&quot;"]:
+            with self.subTest(fields_enclosed_by=fields_enclosed_by):
+                path = self.build_archive(OCCURRENCE_ROWS, fields_enclosed_by)
+                path_with_blank_lines = self.build_archive(
+                    OCCURRENCE_ROWS[:2] + [""] + OCCURRENCE_ROWS[2:] + [""],
+                    fields_enclosed_by,
+                )
+                with StreamingDwCAReader(path) as dwca:
+                    expected = list(dwca.iter_rows(self.terms))
+                with StreamingDwCAReader(path_with_blank_lines) as dwca:
+                    self.assertEqual(list(dwca.iter_rows(self.terms)), expected)
+
+    def test_carriage_return_in_field(self):
+        # Fast path: only "\n" (or "\r\n") ends a line
+        path = self.build_archive(
+            OCCURRENCE_ROWS[:2] + ["2\tdataset\ra\t2021\r"] + OCCURRENCE_ROWS[3:]
+        )
+        with StreamingDwCAReader(path) as dwca:
+            rows = list(dwca.iter_rows(self.terms))
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(
+            rows[1], ("2", "dataset\ra", "Default dataset name", "2021", "")
+        )
+
+    def test_truncated_row(self):
+        for fields_enclosed_by in ["", "&quot;"]:
+            with self.subTest(fields_enclosed_by=fields_enclosed_by):
+                path = self.build_archive(
+                    OCCURRENCE_ROWS[:2] + ["2\tdataset-a"] + OCCURRENCE_ROWS[3:],
+                    fields_enclosed_by,
+                )
+                with StreamingDwCAReader(path) as dwca:
+                    with self.assertRaisesMessage(
+                        ValueError, "occurrence.txt, line 3: truncated row (2 fields)"
+                    ):
+                        list(dwca.iter_rows(self.terms))
+
+
+class DatasetNamesCacheTests(SimpleTestCase):
+    api_url = "https://gbif.test/v1"
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "dataset_names.json")
+        self.requested_urls = []
+        self.titles = {"dataset-a": "Dataset A", "dataset-b": "Dataset B"}
+
+    def fetch_json(self, url: str) -> dict:
+        """Stub of the GBIF API: unknown datasets are 404 errors"""
+        self.requested_urls.append(url)
+        key = url.rsplit("/", 1)[1]
+        if key not in self.titles:
+            raise requests.HTTPError(f"404 Client Error: Not Found for url: {url}")
+        return {"key": key, "title": self.titles[key]}
+
+    def build_cache(self, ttl: int = 3600) -> DatasetNamesCache:
+        return DatasetNamesCache(
+            path=self.path,
+            ttl=ttl,
+            fetch_json=self.fetch_json,
+            api_url=self.api_url,
+            max_concurrent_requests=2,
+        )
+
+    def test_resolve(self):
+        names = self.build_cache().resolve(["dataset-a", "dataset-b", "dataset-a"])
+        self.assertEqual(names, {"dataset-a": "Dataset A", "dataset-b": "Dataset B"})
+        self.assertCountEqual(
+            self.requested_urls,
+            [f"{self.api_url}/dataset/dataset-a", f"{self.api_url}/dataset/dataset-b"],
+        )
+
+    def test_names_are_persisted(self):
+        self.build_cache().resolve(["dataset-a"])
+        self.requested_urls.clear()
+
+        self.assertEqual(self.build_cache().get("dataset-a"), "Dataset A")
+        self.assertEqual(self.requested_urls, [])
+
+    def test_expired_names_are_fetched_again(self):
+        self.build_cache(ttl=0).resolve(["dataset-a"])
+        self.titles["dataset-a"] = "Dataset A (renamed)"
+
+        self.assertEqual(
+            self.build_cache(ttl=0).get("dataset-a"), "Dataset A (renamed)"
+        )
+
+    def test_failed_names_are_empty(self):
+        cache = self.build_cache()
+        names = cache.resolve(["dataset-a", "unknown"])
+        self.assertEqual(names, {"dataset-a": "Dataset A", "unknown": ""})
+
+        # Not cached: fetched again next time
+        self.requested_urls.clear()
+        self.assertEqual(cache.get("unknown"), "")
+        self.assertEqual(self.requested_urls, [f"{self.api_url}/dataset/unknown"])
+
+    def test_concurrent_caches_keep_each_other_names(self):
+        # Both loaded before any name is saved, like two imports running at the same time
+        cache_a, cache_b = self.build_cache(), self.build_cache()
+        cache_a.resolve(["dataset-a"])
+        cache_b.resolve(["dataset-b"])
+        self.requested_urls.clear()
+
+        names = self.build_cache().resolve(["dataset-a", "dataset-b"])
+        self.assertEqual(names, {"dataset-a": "Dataset A", "dataset-b": "Dataset B"})
+        self.assertEqual(self.requested_urls, [])
+
+    def test_path_without_directory(self):
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(os.path.dirname(self.path))
+        self.path = "dataset_names.json"
+
+        self.build_cache().resolve(["dataset-a"])
+        self.assertTrue(os.path.exists("dataset_names.json"))
+
+
+class ParseInProcessPoolTests(SimpleTestCase):
+    @staticmethod
+    def row(
+        gbif_id: int, taxon_key: int, year: str = "2022", individual_count: str = ""
+    ) -> tuple:
+        """Values of OCCURRENCE_TERMS"""
+        return (
+            str(gbif_id),
+            str(taxon_key),
+            "Rattus norvegicus",
+            "dataset-a",
+            "Dataset A",
+            year,
+            "3",
+            "",  # Incomplete date
+            individual_count,
+            "4.35",
+            "50.85",
+            "",
+            "Brussels",
+            "",
+            "Rat trap" if gbif_id % 2 else "",
+            "",
+        )
+
+    def test_same_results_as_serial_parsing(self):
+        taxon_key = settings.GBIF_TAXA_IDS_TO_IMPORT[0]
+        other_taxon_key = max(settings.GBIF_TAXA_IDS_TO_IMPORT) + 1
+        rows = []
+        for i in range(20):
+            rows += [
+                self.row(i * 10, taxon_key),
+                self.row(i * 10 + 1, taxon_key, individual_count="3"),
+                # Filtered out (None): other taxon, no year, no individuals
+                self.row(i * 10 + 2, other_taxon_key),
+                self.row(i * 10 + 3, taxon_key, year=""),
+                self.row(i * 10 + 4, taxon_key, individual_count="0"),
+            ]
+        expected = list(map(import_all_observations.parse_occurrence_row, rows))
+        self.assertEqual(expected.count(None), 60)
+
+        # Small chunks, so several are in flight at once
+        with mock.patch.object(import_all_observations, "PARSING_CHUNK_SIZE", 7):
+            self.assertEqual(
+                list(import_all_observations.parse_in_process_pool(rows, 2)), expected
+            )
+            self.assertEqual(
+                list(import_all_observations.parse_in_process_pool(iter(rows), 2)),
+                expected,
+            )
+
+
+class TileStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "store", "tiles.sqlite3")
+        self.store = tile_store.TileStore(self.path, max_size_bytes=1000)
+        self.now = 1_700_000_000.0
+
+    def at(self, timestamp: float):
+        """Context manager: the store's clock shows timestamp"""
+        return mock.patch.object(tile_store.time, "time", return_value=timestamp)
+
+    def put(self, x: int, size: int = 300, layer: str = "hex", data_version="v1"):
+        self.store.put(data_version, layer, 5, x, 0, "", b"t" * size, f"etag-{x}")
+
+    def get(self, x: int, layer: str = "hex", data_version="v1", max_age=None):
+        return self.store.get(data_version, layer, 5, x, 0, "", max_age=max_age)
+
+    def test_round_trip(self):
+        self.store.put("v1", "hex", 5, 16, 10, "species=1", b"data", "etag")
+
+        self.assertEqual(
+            self.store.get("v1", "hex", 5, 16, 10, "species=1"), (b"data", "etag")
+        )
+        self.assertIsNone(self.store.get("v1", "hex", 5, 16, 10, ""))
+        self.assertIsNone(self.store.get("v2", "hex", 5, 16, 10, "species=1"))
+        self.assertIsNone(self.store.get("v1", "hex", 5, 16, 11, "species=1"))
+
+    def test_max_age(self):
+        with self.at(self.now - 120):
+            self.put(0)
+
+        with self.at(self.now):
+            self.assertIsNone(self.get(0, max_age=60))
+            self.assertIsNotNone(self.get(0, max_age=300))
+            self.assertIsNotNone(self.get(0))
+
+    def test_evict_least_recently_used(self):
+        for x in range(4):  # 1200 bytes
+            with self.at(self.now + x):
+                self.put(x)
+        # Tile 0 is used again: tile 1 is now the least recently used
+        with self.at(self.now + tile_store.LAST_ACCESS_RESOLUTION + 10):
+            self.get(0)
+
+        # Down to 90% of the maximum size
+        self.assertEqual(self.store.evict(), 1)
+        self.assertEqual(self.store.size(), 900)
+        self.assertIsNone(self.get(1))
+        for x in [0, 2, 3]:
+            self.assertIsNotNone(self.get(x))
+
+        # Small enough
+        self.assertEqual(self.store.evict(), 0)
+
+    def test_purge(self):
+        self.put(0, layer="hex")
+        self.put(1, layer="occurrences")
+        self.put(2, layer="hex", data_version="v2")
+
+        self.assertEqual(self.store.purge(except_data_version="v2"), 2)
+        self.assertIsNotNone(self.get(2, data_version="v2"))
+
+        self.put(0, layer="hex")
+        self.put(1, layer="occurrences")
+        self.assertEqual(self.store.purge(layer="hex"), 2)
+        self.assertIsNotNone(self.get(1, layer="occurrences"))
+        self.assertEqual(self.store.purge(), 1)
+
+    def test_try_lock(self):
+        with self.at(self.now):
+            self.assertTrue(self.store.try_lock("v1/hex/5/0/0/"))
+            # Another connection (thread or process) of the same store
+            other_store = tile_store.TileStore(self.path, max_size_bytes=1000)
+            self.assertFalse(other_store.try_lock("v1/hex/5/0/0/"))
+            self.assertTrue(other_store.try_lock("v1/hex/5/4/0/"))
+
+        self.store.unlock("v1/hex/5/0/0/")
+        with self.at(self.now):
+            self.assertTrue(other_store.try_lock("v1/hex/5/0/0/"))
+
+    def test_lock_timeout(self):
+        with self.at(self.now):
+            self.assertTrue(self.store.try_lock("key"))
+        with self.at(self.now + tile_store.RENDER_LOCK_TIMEOUT - 1):
+            self.assertFalse(self.store.try_lock("key"))
+        # The holder probably crashed
+        with self.at(self.now + tile_store.RENDER_LOCK_TIMEOUT + 1):
+            self.assertTrue(self.store.try_lock("key"))
+
+    def test_schema_reset(self):
+        self.put(0)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(f"PRAGMA user_version={tile_store.SCHEMA_VERSION + 1}")
+
+        self.assertIsNone(
+            tile_store.TileStore(self.path, max_size_bytes=1000).get(
+                "v1", "hex", 5, 0, 0, ""
+            )
+        )
+
+    def test_path_without_directory(self):
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(os.path.dirname(os.path.dirname(self.path)))
+        store = tile_store.TileStore("tiles.sqlite3", max_size_bytes=1000)
+        store.put("v1", "hex", 5, 0, 0, "", b"data", "etag")
+        self.assertEqual(store.get("v1", "hex", 5, 0, 0, ""), (b"data", "etag"))
+
+
+class FiltersKeyTests(SimpleTestCase):
+    def test_order_does_not_matter(self):
+        self.assertEqual(
+            filters_key(QueryDict("speciesIds[]=2&speciesIds[]=1&datasetId=3")),
+            filters_key(QueryDict("datasetId=3&speciesIds[]=1&speciesIds[]=2")),
+        )
+        self.assertEqual(
+            filters_key(QueryDict("speciesIds[]=2&speciesIds[]=1&datasetId=3")),
+            "datasetId=3&speciesIds[]=1,2",
+        )
+
+    def test_empty_values_are_ignored(self):
+        self.assertEqual(
+            filters_key(QueryDict("datasetId=&startDate=null&endDate=2022-01-01")),
+            "endDate=2022-01-01",
+        )
+        self.assertEqual(
+            filters_key(QueryDict("areaIds[]=&areaIds[]=4&areaIds[]=null")),
+            "areaIds[]=4",
+        )
+        self.assertEqual(filters_key(QueryDict("datasetId=null")), "")
+
+
+class PrecompressedResponseTests(SimpleTestCase):
+    content = b'{"count": 42}'
+
+    def setUp(self):
+        self.gzipped_content, self.etag = compress(self.content)
+
+    def response(self, **headers):
+        request = RequestFactory().get("/api/counter", **headers)
+        return precompressed_response(
+            request, self.gzipped_content, "application/json", self.etag
+        )
+
+    def test_gzip(self):
+        response = self.response(HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.gzipped_content)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], f'"{self.etag}-gzip"')
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    def test_identity(self):
+        response = self.response()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.content)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["ETag"], f'"{self.etag}"')
+
+    def test_not_modified(self):
+        response = self.response(
+            HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=f'"{self.etag}-gzip"'
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], f'"{self.etag}-gzip"')
+
+        response = self.response(HTTP_IF_NONE_MATCH=f'"other", "{self.etag}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_of_the_other_representation(self):
+        # The client has the gzipped content, but doesn't accept gzip anymore
+        response = self.response(HTTP_IF_NONE_MATCH=f'"{self.etag}-gzip"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.content)
+
+
+class PreparedStatementsTests(SimpleTestCase):
+    def test_format_placeholders(self):
+        self.assertEqual(
+            prepared_statements.to_numeric_placeholders(
+                "SELECT * FROM t WHERE a = %s AND b IN (%s, %s)"
+            ),
+            "SELECT * FROM t WHERE a = $1 AND b IN ($2, $3)",
+        )
+
+    def test_pyformat_placeholders(self):
+        # A repeated parameter keeps its number
+        self.assertEqual(
+            prepared_statements.to_numeric_placeholders(
+                "SELECT %(zoom)s, %(x)s FROM t WHERE z = %(zoom)s AND y = %(y)s"
+            ),
+            "SELECT $1, $2 FROM t WHERE z = $1 AND y = $3",
+        )
+
+    def test_escaped_percent_signs(self):
+        self.assertEqual(
+            prepared_statements.to_numeric_placeholders(
+                "SELECT * FROM t WHERE name LIKE 'a%%s' AND a = %s AND b = '100%%'"
+            ),
+            "SELECT * FROM t WHERE name LIKE 'a%s' AND a = $1 AND b = '100%'",
+        )
+
+    @override_settings(TILE_PREPARED_STATEMENTS=True)
+    def test_execute_prepared(self):
+        cursor = mock.Mock()
+        cursor.db.prepared_statements = set()
+        query = "SELECT * FROM t WHERE z = %(zoom)s AND x = %(x)s AND %(zoom)s > 0"
+        name = prepared_statements.statement_name(query)
+
+        for x in [1, 2]:
+            prepared_statements.execute_prepared(cursor, query, {"x": x, "zoom": 5})
+
+        self.assertEqual(
+            cursor.execute.call_args_list,
+            [
+                mock.call(
+                    f"PREPARE {name} AS SELECT * FROM t WHERE z = $1 AND x = $2 AND $1 > 0"
+                ),
+                mock.call(f"EXECUTE {name} (%s, %s)", [5, 1]),
+                mock.call(f"EXECUTE {name} (%s, %s)", [5, 2]),
+            ],
+        )
@@ -0,0 +1,485 @@
+"""Persistent tile store: an SQLite database (MBTiles-like) shared by all the web server processes of a node.
+
+Unlike the per-process cache of cache_page, the stored tiles survive restarts and are rendered only once per node. Tiles
+are stored gzipped, with their ETag.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache, partial, wraps
+from typing import Optional, List, Tuple, Callable, Dict, Awaitable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpRequest
+
+from dashboard.cache import (
+    current_data_version,
+    filters_key,
+    compress,
+    precompressed_response,
+)
+
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+
+# The last access time (used for eviction) of a tile is only updated if older than this, to avoid a write per hit
+LAST_ACCESS_RESOLUTION = 60 * 10  # 10 minutes
+# The store size is checked (and tiles evicted if necessary) every EVICTION_CHECK_INTERVAL tiles stored by a process
+EVICTION_CHECK_INTERVAL = 100
+# When the store is too large, the least recently used tiles are evicted until this fraction of the maximum size
+EVICTION_TARGET_RATIO = 0.9
+
+# To be incremented at each change of the schema or of the tiles contents (the tiles of a store with another version are
+# discarded)
+SCHEMA_VERSION = 1
+SCHEMA = [
+    """
+CREATE TABLE IF NOT EXISTS tiles (
+    data_version TEXT NOT NULL,
+    layer TEXT NOT NULL,
+    zoom INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    filters TEXT NOT NULL,
+    data BLOB NOT NULL,
+    etag TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (data_version, layer, zoom, x, y, filters)
+)""",
+    "CREATE INDEX IF NOT EXISTS tiles_last_access ON tiles (last_access)",
+    """
+CREATE TABLE IF NOT EXISTS render_locks (
+    key TEXT PRIMARY KEY,
+    acquired REAL NOT NULL
+)""",
+]
+
+# A metatile is rendered by a single request (of any process) at once: the requests for its other tiles wait for it,
+# checking the store every RENDER_LOCK_POLL_INTERVAL seconds. A lock older than RENDER_LOCK_TIMEOUT seconds (e.g. its
+# process crashed) is ignored.
+RENDER_LOCK_TIMEOUT = 120
+RENDER_LOCK_POLL_INTERVAL = 0.1
+
+
+class TileStore:
+    """Tiles stored by data version, layer, z/x/y and filters key, with a size limit (least recently used tiles are
+    evicted). Tiles of previous data versions are never served again, they are evicted or purged."""
+
+    def __init__(self, path: str, max_size_bytes: int):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        # One connection per thread (and per process, see _connection())
+        self._local = threading.local()
+        self._puts_since_eviction_check = 0
+        self._puts_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # New thread, or forked process
+        if getattr(self._local, "pid", None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # Concurrent readers while a process writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate(conn)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        """Create the schema, or reset it if it has another version"""
+        # Processes starting together: the first one takes the write lock, the others then see the new schema
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS tiles")
+                conn.execute("DROP TABLE IF EXISTS render_locks")
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            for statement in SCHEMA:
+                conn.execute(statement)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(
+        self,
+        data_version: str,
+        layer: str,
+        zoom: int,
+        x: int,
+        y: int,
+        filters: str,
+        max_age: Optional[int] = None,
+    ) -> Optional[Tuple[bytes, str]]:
+        """Return the stored (gzipped) tile and its ETag, or None if it's not stored (or older than max_age seconds)"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT data, etag, created, last_access FROM tiles "
+            "WHERE data_version = ? AND layer = ? AND zoom = ? AND x = ? AND y = ? AND filters = ?",
+            (data_version, layer, zoom, x, y, filters),
+        ).fetchone()
+        if row is None:
+            return None
+
+        data, etag, created, last_access = row
+        now = time.time()
+        if max_age is not None and created < now - max_age:
+            return None
+        if last_access < now - LAST_ACCESS_RESOLUTION:
+            conn.execute(
+                "UPDATE tiles SET last_access = ? "
+                "WHERE data_version = ? AND layer = ? AND zoom = ? AND x = ? AND y = ? AND filters = ?",
+                (now, data_version, layer, zoom, x, y, filters),
+            )
+        return data, etag
+
+    def put(
+        self,
+        data_version: str,
+        layer: str,
+        zoom: int,
+        x: int,
+        y: int,
+        filters: str,
+        data: bytes,
+        etag: str,
+    ) -> None:
+        """Store a tile (data is gzipped, see cache.compress())"""
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO tiles "
+            "(data_version, layer, zoom, x, y, filters, data, etag, size, created, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (data_version, layer, zoom, x, y, filters, data, etag, len(data), now, now),
+        )
+
+        # Shared by the threads of the process (threaded server, seed_tiles --workers)
+        with self._puts_lock:
+            self._puts_since_eviction_check += 1
+            check_eviction = self._puts_since_eviction_check >= EVICTION_CHECK_INTERVAL
+            if check_eviction:
+                self._puts_since_eviction_check = 0
+        if check_eviction:
+            self.evict()
+
+    def try_lock(self, key: str) -> bool:
+        """Take the render lock of key (see RENDER_LOCK_TIMEOUT), return False if it's already held"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "DELETE FROM render_locks WHERE key = ? AND acquired < ?",
+            (key, now - RENDER_LOCK_TIMEOUT),
+        )
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO render_locks (key, acquired) VALUES (?, ?)",
+            (key, now),
+        )
+        return cursor.rowcount == 1
+
+    def unlock(self, key: str) -> None:
+        self._connection().execute("DELETE FROM render_locks WHERE key = ?", (key,))
+
+    def size(self) -> int:
+        """Total size of the stored tiles, in bytes"""
+        return (
+            self._connection()
+            .execute("SELECT COALESCE(SUM(size), 0) FROM tiles")
+            .fetchone()[0]
+        )
+
+    def evict(self) -> int:
+        """If the store is too large, evict the least recently used tiles. Return the number of evicted tiles."""
+        size = self.size()
+        if size <= self.max_size_bytes:
+            return 0
+        excess = size - int(self.max_size_bytes * EVICTION_TARGET_RATIO)
+
+        cursor = self._connection().execute(
+            """
+            DELETE FROM tiles WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, SUM(size) OVER (ORDER BY last_access, rowid) - size AS previous_size FROM tiles
+                ) WHERE previous_size < ?
+            )
+            """,
+            (excess,),
+        )
+        return cursor.rowcount
+
+    def purge(
+        self, layer: Optional[str] = None, except_data_version: Optional[str] = None
+    ) -> int:
+        """Delete the stored tiles (of a given layer if specified, except those of a data version if specified).
+
+        Return the number of deleted tiles."""
+        conn = self._connection()
+        cursor = conn.execute(
+            "DELETE FROM tiles WHERE (? IS NULL OR layer = ?) AND (? IS NULL OR data_version != ?)",
+            (layer, layer, except_data_version, except_data_version),
+        )
+        conn.execute("VACUUM")
+        return cursor.rowcount
+
+    def stats(self) -> List[Tuple[str, str, int, int]]:
+        """Return (data version, layer, number of tiles, size in bytes) for each data version and layer"""
+        return (
+            self._connection()
+            .execute(
+                "SELECT data_version, layer, COUNT(*), SUM(size) FROM tiles "
+                "GROUP BY data_version, layer ORDER BY MAX(created), layer"
+            )
+            .fetchall()
+        )
+
+
+@lru_cache(maxsize=None)
+def default_tile_store() -> Optional[TileStore]:
+    """The tile store configured in settings, None if disabled"""
+    if settings.TILE_STORE_PATH is None:
+        return None
+    return TileStore(settings.TILE_STORE_PATH, settings.TILE_STORE_MAX_SIZE_BYTES)
+
+
+def metatile_origin(zoom: int, x: int, y: int, size: int) -> Tuple[int, int, int]:
+    """Return x0, y0 (top left tile) and size of the metatile containing this tile
+
+    size is a power of 2, reduced if the zoom level has less tiles."""
+    size = min(size, 2**zoom)
+    return x - x % size, y - y % size, size
+
+
+def _stored_tile(
+    layer: str, zoom: int, x: int, y: int, filters: str, max_age: Optional[int]
+) -> Tuple[Optional[TileStore], str, Optional[Tuple[bytes, str]]]:
+    """Return the tile store, the current data version and the stored tile (None if not stored)"""
+    store = default_tile_store()
+    data_version = current_data_version()
+    stored = None
+    if store is not None:
+        stored = store.get(data_version, layer, zoom, x, y, filters, max_age=max_age)
+    return store, data_version, stored
+
+
+def _store_tiles(
+    store: Optional[TileStore],
+    data_version: str,
+    layer: str,
+    zoom: int,
+    filters: str,
+    tiles: Dict[Tuple[int, int], bytes],
+) -> Dict[Tuple[int, int], Tuple[bytes, str]]:
+    """Compress and store (if the store is enabled) the rendered tiles. Return them as (gzipped data, ETag)"""
+    compressed = {}
+    for (x, y), content in tiles.items():
+        data, etag = compress(content)
+        if store is not None:
+            store.put(data_version, layer, zoom, x, y, filters, data, etag)
+        compressed[(x, y)] = data, etag
+    return compressed
+
+
+def _metatile_lock_key(
+    data_version: str, layer: str, zoom: int, x0: int, y0: int, filters: str
+) -> str:
+    return "/".join(str(part) for part in (data_version, layer, zoom, x0, y0, filters))
+
+
+def _renders_metatiles(store: Optional[TileStore], render_metatile) -> bool:
+    return (
+        store is not None
+        and render_metatile is not None
+        and settings.TILE_METATILE_SIZE > 1
+    )
+
+
+def _render_metatile_once(
+    store: TileStore,
+    data_version: str,
+    layer: str,
+    zoom: int,
+    x: int,
+    y: int,
+    filters: str,
+    max_age: Optional[int],
+    render: Callable[[int, int, int], Dict[Tuple[int, int], bytes]],
+) -> Tuple[bytes, str]:
+    """Render (render(x0, y0, size)) and store the metatile containing this tile, unless another request does it
+
+    Concurrent requests for the tiles of a missing metatile wait for a single one of them to render it (single flight).
+    Return the tile as (gzipped data, ETag)."""
+    x0, y0, size = metatile_origin(zoom, x, y, settings.TILE_METATILE_SIZE)
+    lock_key = _metatile_lock_key(data_version, layer, zoom, x0, y0, filters)
+    while not store.try_lock(lock_key):
+        time.sleep(RENDER_LOCK_POLL_INTERVAL)
+        stored = store.get(data_version, layer, zoom, x, y, filters, max_age)
+        if stored is not None:
+            return stored
+    try:
+        # Stored by another request between our first check and the lock?
+        stored = store.get(data_version, layer, zoom, x, y, filters, max_age)
+        if stored is None:
+            tiles = render(x0, y0, size)
+            stored = _store_tiles(store, data_version, layer, zoom, filters, tiles)[
+                (x, y)
+            ]
+        return stored
+    finally:
+        store.unlock(lock_key)
+
+
+async def _async_render_metatile_once(
+    store: TileStore,
+    data_version: str,
+    layer: str,
+    zoom: int,
+    x: int,
+    y: int,
+    filters: str,
+    max_age: Optional[int],
+    render: Callable[[int, int, int], Awaitable[Dict[Tuple[int, int], bytes]]],
+) -> Tuple[bytes, str]:
+    """Same as _render_metatile_once(), with an async render()"""
+    x0, y0, size = metatile_origin(zoom, x, y, settings.TILE_METATILE_SIZE)
+    lock_key = _metatile_lock_key(data_version, layer, zoom, x0, y0, filters)
+    while not await sync_to_async(store.try_lock)(lock_key):
+        await asyncio.sleep(RENDER_LOCK_POLL_INTERVAL)
+        stored = await sync_to_async(store.get)(
+            data_version, layer, zoom, x, y, filters, max_age
+        )
+        if stored is not None:
+            return stored
+    try:
+        stored = await sync_to_async(store.get)(
+            data_version, layer, zoom, x, y, filters, max_age
+        )
+        if stored is None:
+            tiles = await render(x0, y0, size)
+            stored = (
+                await sync_to_async(_store_tiles)(
+                    store, data_version, layer, zoom, filters, tiles
+                )
+            )[(x, y)]
+        return stored
+    finally:
+        await sync_to_async(store.unlock)(lock_key)
+
+
+def tile_stored(
+    layer: str,
+    max_age: Optional[int] = None,
+    render_metatile: Optional[
+        Callable[[HttpRequest, int, int, int, int], Dict[Tuple[int, int], bytes]]
+    ] = None,
+):
+    """Decorator for the tile views (request, zoom, x, y): serve the tile from the store, or render and store it
+
+    Stored tiles are valid until the data changes (see cache.current_data_version()), or for max_age seconds if set.
+    Responses are gzipped and have an ETag, even if the store is disabled.
+
+    If render_metatile (request, zoom, x0, y0, size -> {(x, y): tile data}) is provided, a missing tile is rendered
+    together with the others of its metatile (settings.TILE_METATILE_SIZE), and they are all stored: requests for the
+    neighbouring tiles are then hits. A metatile is rendered once, even if its tiles are requested concurrently.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(
+            request: HttpRequest, zoom: int, x: int, y: int, *args, **kwargs
+        ):
+            filters = filters_key(request.GET)
+            store, data_version, stored = _stored_tile(
+                layer, zoom, x, y, filters, max_age
+            )
+
+            if stored is None:
+                if _renders_metatiles(store, render_metatile):
+                    stored = _render_metatile_once(
+                        store,
+                        data_version,
+                        layer,
+                        zoom,
+                        x,
+                        y,
+                        filters,
+                        max_age,
+                        partial(render_metatile, request, zoom),
+                    )
+                else:
+                    response = view_func(request, zoom, x, y, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    tiles = {(x, y): response.content}
+                    stored = _store_tiles(
+                        store, data_version, layer, zoom, filters, tiles
+                    )[(x, y)]
+
+            data, etag = stored
+            return precompressed_response(request, data, MVT_CONTENT_TYPE, etag)
+
+        return wrapped_view
+
+    return decorator
+
+
+def async_tile_stored(
+    layer: str,
+    max_age: Optional[int] = None,
+    render_metatile: Optional[
+        Callable[
+            [HttpRequest, int, int, int, int],
+            Awaitable[Dict[Tuple[int, int], bytes]],
+        ]
+    ] = None,
+):
+    """Same as tile_stored(), for async tile views (and an async render_metatile)
+
+    The tile store and the data version (SQLite and Django ORM) are accessed from a worker thread."""
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapped_view(
+            request: HttpRequest, zoom: int, x: int, y: int, *args, **kwargs
+        ):
+            filters = filters_key(request.GET)
+            store, data_version, stored = await sync_to_async(_stored_tile)(
+                layer, zoom, x, y, filters, max_age
+            )
+
+            if stored is None:
+                if _renders_metatiles(store, render_metatile):
+                    stored = await _async_render_metatile_once(
+                        store,
+                        data_version,
+                        layer,
+                        zoom,
+                        x,
+                        y,
+                        filters,
+                        max_age,
+                        partial(render_metatile, request, zoom),
+                    )
+                else:
+                    response = await view_func(request, zoom, x, y, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    tiles = {(x, y): response.content}
+                    stored = (
+                        await sync_to_async(_store_tiles)(
+                            store, data_version, layer, zoom, filters, tiles
+                        )
+                    )[(x, y)]
+
+            data, etag = stored
+            return precompressed_response(request, data, MVT_CONTENT_TYPE, etag)
+
+        return wrapped_view
+
+    return decorator
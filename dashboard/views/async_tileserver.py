@@ -0,0 +1,167 @@
+"""Async versions of the tile server views, used if settings.ASYNC_TILE_VIEWS is True (see mica/urls.py).
+
+The queries are the same as in tileserver.py, but they are executed through a bounded pool of async PostgreSQL
+connections (psycopg 3, optional dependency) instead of blocking a worker thread each: a single ASGI process can serve
+many tile requests in flight.
+"""
+import asyncio
+from typing import Dict, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+
+from .helpers import filters_from_request
+from .tileserver import (
+    OCCURRENCES_LAYER,
+    HEX_AGGREGATED_OCCURRENCES_LAYER,
+    OCCURRENCES_FOR_WATER_LAYER,
+    AREAS_LAYER,
+    occurrences_tile_query,
+    hex_aggregated_occurrences_metatile_query,
+    occurrences_for_water_metatile_query,
+    areas_tile_query,
+    areas_tile_request_params,
+)
+from ..tile_store import async_tile_stored, MVT_CONTENT_TYPE
+
+# One pool per event loop (the connections of a pool can only be used in the loop that opened it): event loop -> task
+# opening the pool
+_pools = {}
+
+
+def _conninfo() -> str:
+    """Connection string of the default database, built like Django's PostgreSQL backend does"""
+    from psycopg.conninfo import make_conninfo
+
+    db = settings.DATABASES["default"]
+    params = {
+        "dbname": db.get("NAME"),
+        "user": db.get("USER"),
+        "password": db.get("PASSWORD"),
+        "host": db.get("HOST"),
+        "port": db.get("PORT"),
+    }
+    # Connection parameters (sslmode, connect_timeout, options...), except the isolation level which Django handles
+    params.update(
+        (k, v) for k, v in db.get("OPTIONS", {}).items() if k != "isolation_level"
+    )
+    return make_conninfo(**{k: str(v) for k, v in params.items() if v})
+
+
+async def _open_pool():
+    try:
+        from psycopg_pool import AsyncConnectionPool
+    except ImportError:
+        raise ImproperlyConfigured(
+            "ASYNC_TILE_VIEWS requires psycopg 3 and its connection pool: pip install -r requirements-async.txt"
+        )
+
+    pool = AsyncConnectionPool(
+        _conninfo(),
+        min_size=settings.ASYNC_TILE_DB_POOL_MIN_SIZE,
+        max_size=settings.ASYNC_TILE_DB_POOL_MAX_SIZE,
+        kwargs={"autocommit": True},
+        open=False,
+    )
+    await pool.open()
+    return pool
+
+
+async def _get_pool():
+    loop = asyncio.get_running_loop()
+    if loop not in _pools:
+        # Concurrent requests wait for the same pool to be opened
+        _pools[loop] = loop.create_task(_open_pool())
+    return await _pools[loop]
+
+
+async def _fetch_all(query, bind_params) -> list:
+    pool = await _get_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cursor:
+            # Server-side parameters binding: psycopg prepares the statement of each distinct query (i.e. filter shape,
+            # see tileserver._prepare_query()) on each connection of the pool
+            await cursor.execute(
+                query, bind_params, prepare=settings.TILE_PREPARED_STATEMENTS
+            )
+            return await cursor.fetchall()
+
+
+async def _mvt_query_data(query, bind_params) -> bytes:
+    """Async version of tileserver._mvt_query_data()"""
+    rows = await _fetch_all(query, bind_params)
+    if not rows or rows[0][0] is None:
+        return b""
+    return bytes(rows[0][0])
+
+
+async def _mvt_metatile_query_data(query, bind_params) -> Dict[Tuple[int, int], bytes]:
+    """Async version of tileserver._mvt_metatile_query_data()"""
+    return {
+        (x, y): bytes(data) if data is not None else b""
+        for x, y, data in await _fetch_all(query, bind_params)
+    }
+
+
+@async_tile_stored(OCCURRENCES_LAYER)
+async def mvt_tiles_occurrences(request, zoom, x, y):
+    """Tile server, showing non-aggregated occurrences, for high zoom levels. Filters are honoured."""
+    return HttpResponse(
+        await _mvt_query_data(
+            *occurrences_tile_query(zoom, x, y, *filters_from_request(request))
+        ),
+        content_type=MVT_CONTENT_TYPE,
+    )
+
+
+async def _hex_aggregated_occurrences_metatile_for_request(
+    request, zoom: int, x0: int, y0: int, size: int
+) -> Dict[Tuple[int, int], bytes]:
+    return await _mvt_metatile_query_data(
+        *hex_aggregated_occurrences_metatile_query(
+            zoom, x0, y0, size, *filters_from_request(request)
+        )
+    )
+
+
+@async_tile_stored(
+    HEX_AGGREGATED_OCCURRENCES_LAYER,
+    render_metatile=_hex_aggregated_occurrences_metatile_for_request,
+)
+async def mvt_tiles_hex_aggregated_occurrences(request, zoom, x, y):
+    """Tile server, showing occurrences aggregated by hexagon squares. Filters are honoured."""
+    tiles = await _hex_aggregated_occurrences_metatile_for_request(
+        request, zoom, x, y, 1
+    )
+    return HttpResponse(tiles[(x, y)], content_type=MVT_CONTENT_TYPE)
+
+
+async def _occurrences_for_water_metatile_for_request(
+    request, zoom: int, x0: int, y0: int, size: int
+) -> Dict[Tuple[int, int], bytes]:
+    return await _mvt_metatile_query_data(
+        *occurrences_for_water_metatile_query(
+            zoom, x0, y0, size, *filters_from_request(request)
+        )
+    )
+
+
+@async_tile_stored(
+    OCCURRENCES_FOR_WATER_LAYER,
+    render_metatile=_occurrences_for_water_metatile_for_request,
+)
+async def mvt_tiles_occurrences_for_water(request, zoom, x, y):
+    tiles = await _occurrences_for_water_metatile_for_request(request, zoom, x, y, 1)
+    return HttpResponse(tiles[(x, y)], content_type=MVT_CONTENT_TYPE)
+
+
+@async_tile_stored(AREAS_LAYER)
+async def mvt_tiles_areas(request, zoom, x, y):
+    """Tile server, showing MICA areas with biodiversity richness attributes (see tileserver.areas_tile_query())."""
+    return HttpResponse(
+        await _mvt_query_data(
+            *areas_tile_query(zoom, x, y, *areas_tile_request_params(request))
+        ),
+        content_type=MVT_CONTENT_TYPE,
+    )
@@ -2,10 +2,9 @@
 from datetime import datetime
 
 from django.http import HttpRequest, QueryDict
-from django.contrib.gis.db.models.aggregates import Union as AggregateUnion
 from typing import List, Optional
 
-from dashboard.models import Occurrence, Area
+from dashboard.models import Occurrence, OccurrenceArea
 
 
 def readable_string(input_string: str) -> str:
@@ -99,10 +98,11 @@ def request_to_occurrences_qs(request):
         else:
             qs = qs.filter(is_catch=False)
     if areas_ids:
-        combined_areas = Area.objects.filter(pk__in=areas_ids).aggregate(
-            area=AggregateUnion("mpoly")
-        )["area"]
-        qs = qs.filter(location__within=combined_areas)
+        qs = qs.filter(
+            pk__in=OccurrenceArea.objects.filter(area_id__in=areas_ids).values(
+                "occurrence_id"
+            )
+        )
 
     return qs
 
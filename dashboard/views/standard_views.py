@@ -1,17 +1,23 @@
 from django.core.paginator import Paginator
 from django.core.serializers import serialize
 from django.db.models import Count
-from django.db.models.functions import ExtractYear, TruncMonth
-from django.http import JsonResponse, HttpRequest, HttpResponse
+from django.db.models.functions import TruncMonth
+from django.http import JsonResponse, HttpRequest, HttpResponse, QueryDict
 from django.shortcuts import render, get_object_or_404
 
+from dashboard.cache import cache_per_data_version
 from dashboard.models import (
     Dataset,
     Species,
     Area,
     DataImport,
-    BiodiversityIndicatorObservation,
+    AreaBiodiversitySummary,
+    AreaSimplifiedGeometry,
     BiodiversityIndicatorSpecies,
+    area_simplification_band,
+    area_zoom_band,
+    AREA_SIMPLIFICATION_BANDS,
+    AREA_FULL_RESOLUTION_MIN_ZOOM,
 )
 
 from dashboard.views.helpers import request_to_occurrences_qs, extract_int_request
@@ -20,20 +26,30 @@ from dashboard.views.helpers import request_to_occurrences_qs, extract_int_reque
 def index(request):
     latest_data_import = DataImport.objects.order_by("-start").first()
     return render(
-        request, "dashboard/index.html", {"latest_data_import": latest_data_import}
+        request,
+        "dashboard/index.html",
+        {
+            "latest_data_import": latest_data_import,
+            # The area overlay is only reloaded when the zoom level enters another band (see area_geojson())
+            "area_zoom_bands": AREA_SIMPLIFICATION_BANDS
+            + [AREA_FULL_RESOLUTION_MIN_ZOOM],
+        },
     )
 
 
+@cache_per_data_version()
 def available_datasets(_request: HttpRequest) -> JsonResponse:
     data = list(Dataset.objects.all().values())
     return JsonResponse(data, safe=False)
 
 
+@cache_per_data_version()
 def available_species(_request: HttpRequest) -> JsonResponse:
     data = list(Species.objects.all().values())
     return JsonResponse(data, safe=False)
 
 
+@cache_per_data_version()
 def occurrences_json(request: HttpRequest) -> JsonResponse:
     order = request.GET.get("order")
     limit = extract_int_request(request, "limit")
@@ -56,6 +72,7 @@ def occurrences_json(request: HttpRequest) -> JsonResponse:
     )
 
 
+@cache_per_data_version()
 def occurrences_counter(request: HttpRequest) -> JsonResponse:
     """Count the occurrences according to the filters received
 
@@ -65,6 +82,7 @@ def occurrences_counter(request: HttpRequest) -> JsonResponse:
     return JsonResponse({"count": qs.count()})
 
 
+@cache_per_data_version()
 def occurrences_monthly_histogram(request: HttpRequest) -> JsonResponse:
     """Give the (filtered) number of occurrences per month
 
@@ -90,13 +108,37 @@ def occurrences_monthly_histogram(request: HttpRequest) -> JsonResponse:
     )
 
 
-def area_geojson(_: HttpRequest, id: int):
-    """Return a specific area as GeoJSON"""
+def _area_geojson_cache_params(params: QueryDict) -> QueryDict:
+    """The zoom levels of a band share the same cache entry"""
+    zoom = params.get("zoom")
+    if zoom is None or not zoom.isdigit():
+        return params
+    params = params.copy()
+    params["zoom"] = str(area_zoom_band(int(zoom)))
+    return params
+
+
+@cache_per_data_version(normalize_params=_area_geojson_cache_params)
+def area_geojson(request: HttpRequest, id: int):
+    """Return a specific area as GeoJSON
+
+    If a zoom level is provided (optional "zoom" parameter), the geometry is simplified accordingly."""
     area = get_object_or_404(Area, pk=id)
 
+    zoom = extract_int_request(request, "zoom")
+    if zoom is not None:
+        band = area_simplification_band(zoom)
+        if band is not None:
+            simplified = AreaSimplifiedGeometry.objects.filter(
+                area=area, min_zoom=band
+            ).first()
+            if simplified is not None:
+                area.mpoly = simplified.mpoly
+
     return HttpResponse(serialize("geojson", [area]), content_type="application/json")
 
 
+@cache_per_data_version()
 def areas_list_json(_: HttpRequest) -> JsonResponse:
     """A list of all areas available"""
     areas = Area.objects.all()
@@ -106,11 +148,11 @@ def areas_list_json(_: HttpRequest) -> JsonResponse:
     )
 
 
+@cache_per_data_version()
 def available_years_biodiversity_index_json(_: HttpRequest) -> JsonResponse:
     """A list of all years available for the biodiversity index"""
     years = (
-        BiodiversityIndicatorObservation.objects.annotate(year=ExtractYear("date"))
-        .order_by("year")
+        AreaBiodiversitySummary.objects.order_by("year")
         .values_list("year", flat=True)
         .distinct()
     )
@@ -1,9 +1,12 @@
+import datetime
 from string import Template
+from typing import Optional, List, Dict, Tuple
 
+from django.conf import settings
 from django.http import HttpResponse, JsonResponse
 from django.db import connection
-from django.views.decorators.cache import cache_page
 
+from jinja2 import Template as JinjaTemplate
 from jinjasql import JinjaSql
 
 from .helpers import (
@@ -13,16 +16,41 @@ from .helpers import (
     extract_array_request,
     extract_int_array_request,
 )
-from ..models import Occurrence, Area, FishnetSquare
-
-TILE_SERVER_CACHING_DURATION = 60 * 60 * 8  # 8 hours
+from ..models import (
+    Occurrence,
+    Area,
+    FishnetSquare,
+    HexagonAggregate,
+    AreaBiodiversitySummary,
+    AreaSimplifiedGeometry,
+    OccurrenceArea,
+    area_simplification_band,
+    WEB_MERCATOR_WORLD_WIDTH,
+    TILE_SIZE_PIXELS,
+)
+from ..cache import cache_per_data_version
+from ..prepared_statements import execute_prepared
+from ..tile_store import tile_stored, MVT_CONTENT_TYPE
 
 AREAS_TABLE_NAME = Area.objects.model._meta.db_table
 OCCURRENCES_TABLE_NAME = Occurrence.objects.model._meta.db_table
+AREA_BIODIVERSITY_SUMMARY_TABLE_NAME = AreaBiodiversitySummary._meta.db_table
+AREA_SIMPLIFIED_GEOMETRY_TABLE_NAME = AreaSimplifiedGeometry._meta.db_table
+OCCURRENCE_AREAS_TABLE_NAME = OccurrenceArea._meta.db_table
 FISHNET_TABLE_NAME = FishnetSquare.objects.model._meta.db_table
+HEXAGON_AGGREGATES_TABLE_NAME = HexagonAggregate._meta.db_table
 FISHNET_WATER_SCORE_FIELD = "waterway_length_in_meters"
 OCCURRENCES_FIELD_NAME_POINT = "location"
 
+# Layer names, in the tile store
+OCCURRENCES_LAYER = "occurrences"
+HEX_AGGREGATED_OCCURRENCES_LAYER = "hex_aggregated_occurrences"
+OCCURRENCES_FOR_WATER_LAYER = "occurrences_for_water"
+AREAS_LAYER = "areas"
+
+# The tile queries are compiled once (see _compile_template()), then only rendered for each request
+_JINJASQL = JinjaSql()
+
 # ! Make sure the following formats are in sync
 DB_DATE_EXCHANGE_FORMAT_PYTHON = "%Y-%m-%d"  # To be passed to strftime()
 DB_DATE_EXCHANGE_FORMAT_POSTGRES = "YYYY-MM-DD"  # To be used in SQL queries
@@ -55,17 +83,22 @@ ZOOM_TO_HEX_SIZE = {
     for key, value in ZOOM_TO_HEX_SIZE_BASELINE.items()
 }
 
+# Zoom levels for which the hexagon grid statistics are precomputed (see HexagonAggregate). The dashboard asks for those
+# of its initial zoom level (7). Higher zoom levels mean more (smaller) hexagons, so a larger table.
+HEX_AGGREGATE_ZOOM_LEVELS = list(range(0, 10))
+
+
+def _compile_template(sql_template: str) -> JinjaTemplate:
+    """Compile a JinjaSql template, to be rendered by _prepare_query()"""
+    return _JINJASQL.env.from_string(sql_template)
+
+
 # !! IMPORTANT !! Make sure the occurrence filtering here is equivalent to what's done in
 # views.helpers.request_to_occurrences_qs Otherwise, occurrences returned on the map and on other
 # components (table, ...) will be inconsistent.
 JINJASQL_FRAGMENT_FILTER_OCCURRENCES = Template(
     """
     SELECT * FROM $occurrences_table_name as occ
-    
-    {% if area_ids %}
-    , (SELECT mpoly FROM $areas_table_name WHERE $areas_table_name.id IN {{ area_ids | inclause }}) AS areas
-    {% endif %}
-    
     WHERE (
         1 = 1
         {% if dataset_id %}
@@ -87,16 +120,44 @@ JINJASQL_FRAGMENT_FILTER_OCCURRENCES = Template(
             AND NOT occ.is_catch 
         {% endif %}
         {% if area_ids %}
-            AND ST_Within(occ.location, areas.mpoly)
+            AND occ.id IN (
+                SELECT occurrence_id FROM $occurrence_areas_table_name WHERE area_id IN {{ area_ids | inclause }}
+            )
         {% endif %}
     )
 """
 ).substitute(
-    areas_table_name=AREAS_TABLE_NAME,
+    occurrence_areas_table_name=OCCURRENCE_AREAS_TABLE_NAME,
     occurrences_table_name=OCCURRENCES_TABLE_NAME,
     date_format=DB_DATE_EXCHANGE_FORMAT_POSTGRES,
 )
 
+# A metatile is a block of size x size tiles, rendered by a single query: the occurrences are filtered and aggregated once
+# for the whole block (whose top left tile is x0, y0 and bottom right tile is x1, y1), then split into individual tiles
+JINJASQL_FRAGMENT_METATILE_ENVELOPE = """
+    ST_Envelope(ST_Collect(ST_TileEnvelope({{ zoom }}, {{ x0 }}, {{ y0 }}), ST_TileEnvelope({{ zoom }}, {{ x1 }}, {{ y1 }})))
+"""
+
+# Returns a (tile x, tile y, MVT) row for each tile of the metatile. $grid is a query returning geom and the attributes.
+JINJASQL_METATILE = Template(
+    """
+    WITH
+        grid AS ($grid),
+        tiles AS (
+            SELECT tx, ty, ST_TileEnvelope({{ zoom }}, tx, ty) AS envelope
+            FROM generate_series({{ x0 }}::integer, {{ x1 }}::integer) AS tx, generate_series({{ y0 }}::integer, {{ y1 }}::integer) AS ty
+        )
+    SELECT tiles.tx, tiles.ty, (
+        SELECT ST_AsMVT(mvtgeom.*) FROM (
+            SELECT ST_AsMVTGeom(grid.geom, tiles.envelope) AS geom, $attributes
+            FROM grid
+            WHERE grid.geom && tiles.envelope
+        ) AS mvtgeom
+    )
+    FROM tiles;
+"""
+)
+
 JINJASQL_FRAGMENT_AGGREGATED_HEX_GRID = Template(
     """
     SELECT COUNT(*), hexes.geom
@@ -104,7 +165,7 @@ JINJASQL_FRAGMENT_AGGREGATED_HEX_GRID = Template(
                         ST_HexagonGrid(
                             {{ hex_size_meters }},
                             {% if grid_extent_viewport %}
-                                ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})
+                                $metatile_envelope
                             {% else %}
                                 ST_SetSRID(ST_EstimatedExtent('$occurrences_table_name', '$occurrences_field_name_point'), 3857)
                             {% endif %} 
@@ -119,14 +180,63 @@ JINJASQL_FRAGMENT_AGGREGATED_HEX_GRID = Template(
     occurrences_table_name=OCCURRENCES_TABLE_NAME,
     occurrences_field_name_point=OCCURRENCES_FIELD_NAME_POINT,
     jinjasql_fragment_filter_occurrences=JINJASQL_FRAGMENT_FILTER_OCCURRENCES,
+    metatile_envelope=JINJASQL_FRAGMENT_METATILE_ENVELOPE,
+)
+
+
+def hexagon_aggregates_sizes() -> Dict[int, int]:
+    """Zoom level -> hexagon size (in meters), for the zoom levels of the hexagon aggregates"""
+    return {zoom: ZOOM_TO_HEX_SIZE[zoom] for zoom in HEX_AGGREGATE_ZOOM_LEVELS}
+
+
+def refresh_hexagon_aggregates() -> None:
+    """To be called after each occurrences import"""
+    HexagonAggregate.refresh(hexagon_aggregates_sizes())
+
+
+JINJASQL_HEXAGON_AGGREGATES_MIN_MAX = Template(
+    """
+    WITH grid AS (
+        SELECT SUM(occurrences_count) AS count
+        FROM $hexagon_aggregates_table_name
+        WHERE
+            zoom = {{ zoom }}
+            {% if dataset_id %}
+                AND source_dataset_id = {{ dataset_id }}
+            {% endif %}
+            {% if species_id %}
+                AND species_id = {{ species_id }}
+            {% endif %}
+            {% if start_date %}
+                AND date >= TO_DATE({{ start_date }}, '$date_format')
+            {% endif %}
+            {% if end_date %}
+                AND date <= TO_DATE({{ end_date }}, '$date_format')
+            {% endif %}
+            {% if records_type == "catches" %}
+                AND is_catch
+            {% endif %}
+            {% if records_type == "observations" %}
+                AND NOT is_catch
+            {% endif %}
+        GROUP BY i, j
+    )
+    SELECT MIN(count), MAX(count) FROM grid;
+"""
+).substitute(
+    hexagon_aggregates_table_name=HEXAGON_AGGREGATES_TABLE_NAME,
+    date_format=DB_DATE_EXCHANGE_FORMAT_POSTGRES,
 )
 
 
-@cache_page(TILE_SERVER_CACHING_DURATION)
+@cache_per_data_version()
 def occurrence_min_max_in_hex_grid(request):
     """Return the min, max occurrences count per hexagon, according to the zoom level. JSON format.
 
-    This can be useful to dynamically color the grid according to the occurrence count
+    This can be useful to dynamically color the grid according to the occurrence count.
+
+    Read from the precomputed HexagonAggregate table, except for area filters (or zoom levels without aggregates), that
+    require joining the occurrences to the grid.
     """
     zoom = extract_int_request(request, "zoom")
     (
@@ -138,18 +248,22 @@ def occurrence_min_max_in_hex_grid(request):
         area_ids,
     ) = filters_from_request(request)
 
-    sql_template = readable_string(
-        Template(
-            """
-    WITH grid AS ($jinjasql_fragment_aggregated_hex_grid)
-    SELECT MIN(count), MAX(count) FROM grid;
-    """
-        ).substitute(
-            jinjasql_fragment_aggregated_hex_grid=JINJASQL_FRAGMENT_AGGREGATED_HEX_GRID
+    if area_ids or zoom not in HEX_AGGREGATE_ZOOM_LEVELS:
+        sql_template = readable_string(
+            Template(
+                """
+        WITH grid AS ($jinjasql_fragment_aggregated_hex_grid)
+        SELECT MIN(count), MAX(count) FROM grid;
+        """
+            ).substitute(
+                jinjasql_fragment_aggregated_hex_grid=JINJASQL_FRAGMENT_AGGREGATED_HEX_GRID
+            )
         )
-    )
+    else:
+        sql_template = readable_string(JINJASQL_HEXAGON_AGGREGATES_MIN_MAX)
 
     sql_params = {
+        "zoom": zoom,
         "hex_size_meters": ZOOM_TO_HEX_SIZE[zoom],
         "grid_extent_viewport": False,
         "dataset_id": dataset_id,
@@ -171,31 +285,69 @@ def occurrence_min_max_in_hex_grid(request):
         return JsonResponse({"min": r[0], "max": r[1]})
 
 
-@cache_page(TILE_SERVER_CACHING_DURATION)
-def mvt_tiles_occurrences(request, zoom, x, y):
-    """Tile server, showing non-aggregated occurrences, for high zoom levels. Filters are honoured."""
-    (
-        dataset_id,
-        species_id,
-        start_date,
-        end_date,
-        records_type,
-        area_ids,
-    ) = filters_from_request(request)
+# A tile of the non-aggregated occurrences has at most OCCURRENCES_TILE_FEATURE_BUDGET points. Denser tiles (e.g.
+# monitored canals) are thinned: their occurrences are snapped to a grid of OCCURRENCES_TILE_CLUSTER_CELL_PIXELS pixels
+# and merged into clusters, i.e. a (cell) point with the occurrences count and the attributes of one of its occurrences.
+# A tile has at most (256 / 8 * (1 + 2 * margin))² = ~1300 clusters, so less than the budget.
+OCCURRENCES_TILE_FEATURE_BUDGET = 2000
+OCCURRENCES_TILE_CLUSTER_CELL_PIXELS = 8
+# Points outside the tile but closer than this (fraction of the tile size) are also encoded, so the symbols crossing the
+# tile borders are fully drawn. Same as ST_AsMVTGeom's default buffer (256 for an extent of 4096).
+OCCURRENCES_TILE_MARGIN = 256 / 4096
 
-    sql_template = readable_string(
+OCCURRENCES_TILE_TEMPLATE = _compile_template(
+    readable_string(
         Template(
             """
-            WITH mvtgeom AS (
-                SELECT 
-                    ST_AsMVTGeom(dashboard_filtered_occ.location, ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})), 
-                    dashboard_filtered_occ.gbif_id, 
-                    dashboard_filtered_occ.individual_count,
-                    dataset.name AS dataset_name
-                FROM 
-                    ($jinjasql_fragment_filter_occurrences) AS dashboard_filtered_occ,
-                    dashboard_dataset AS dataset
-               WHERE dashboard_filtered_occ.source_dataset_id = dataset.id     
+            WITH
+            dashboard_filtered_occ AS (
+                SELECT occ.location, occ.gbif_id, occ.individual_count, occ.source_dataset_id
+                FROM ($jinjasql_fragment_filter_occurrences) AS occ
+                WHERE occ.location && ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }}, margin => {{ margin }})
+            ),
+            thinned AS (
+                SELECT COUNT(*) > {{ feature_budget }} AS value
+                FROM (SELECT 1 FROM dashboard_filtered_occ LIMIT {{ feature_budget }} + 1) AS first_occurrences
+            ),
+            clustered_occ AS (
+                SELECT
+                    *,
+                    COUNT(*) OVER (PARTITION BY cell) AS count,
+                    ROW_NUMBER() OVER (PARTITION BY cell ORDER BY gbif_id) AS rank_in_cell
+                FROM (
+                    SELECT *, ST_SnapToGrid(location, {{ cluster_cell_size }}) AS cell
+                    FROM dashboard_filtered_occ
+                    WHERE (SELECT value FROM thinned)
+                ) AS snapped_occ
+            ),
+            features AS (
+                SELECT location, gbif_id, individual_count, source_dataset_id, 1 AS count
+                FROM dashboard_filtered_occ
+                WHERE NOT (SELECT value FROM thinned)
+                UNION ALL
+                SELECT cell, gbif_id, individual_count, source_dataset_id, count
+                FROM clustered_occ
+                WHERE rank_in_cell = 1
+            ),
+            mvtgeom AS (
+                {% if compact_attributes %}
+                    SELECT
+                        ST_AsMVTGeom(features.location, ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})),
+                        features.gbif_id::bigint AS gbif_id,
+                        features.individual_count,
+                        features.source_dataset_id AS dataset_id,
+                        features.count
+                    FROM features
+                {% else %}
+                    SELECT 
+                        ST_AsMVTGeom(features.location, ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})), 
+                        features.gbif_id, 
+                        features.individual_count,
+                        dataset.name AS dataset_name,
+                        features.count
+                    FROM features, dashboard_dataset AS dataset
+                    WHERE features.source_dataset_id = dataset.id
+                {% endif %}
             )
             SELECT st_asmvt(mvtgeom.*) FROM mvtgeom;
             """
@@ -203,7 +355,26 @@ def mvt_tiles_occurrences(request, zoom, x, y):
             jinjasql_fragment_filter_occurrences=JINJASQL_FRAGMENT_FILTER_OCCURRENCES
         )
     )
+)
+
 
+def occurrences_tile_query(
+    zoom: int,
+    x: int,
+    y: int,
+    dataset_id: Optional[int] = None,
+    species_id: Optional[int] = None,
+    start_date: Optional[datetime.date] = None,
+    end_date: Optional[datetime.date] = None,
+    records_type: Optional[str] = None,
+    area_ids: Optional[List[int]] = None,
+) -> Tuple[str, list]:
+    """Query (and bind parameters) of the MVT tile with the non-aggregated occurrences (clustered if the tile is too
+    dense, see OCCURRENCES_TILE_FEATURE_BUDGET). Filters are honoured.
+
+    With settings.OCCURRENCES_TILE_COMPACT_ATTRIBUTES, the features have the (integer) dataset id instead of the
+    dataset name, to be looked up in the available datasets (see views.available_datasets)."""
+    pixel_size = WEB_MERCATOR_WORLD_WIDTH / (TILE_SIZE_PIXELS * 2**zoom)  # in meters
     sql_params = {
         "dataset_id": dataset_id,
         "species_id": species_id,
@@ -212,6 +383,10 @@ def mvt_tiles_occurrences(request, zoom, x, y):
         "zoom": zoom,
         "x": x,
         "y": y,
+        "margin": OCCURRENCES_TILE_MARGIN,
+        "feature_budget": OCCURRENCES_TILE_FEATURE_BUDGET,
+        "cluster_cell_size": pixel_size * OCCURRENCES_TILE_CLUSTER_CELL_PIXELS,
+        "compact_attributes": settings.OCCURRENCES_TILE_COMPACT_ATTRIBUTES,
     }
 
     if start_date:
@@ -219,36 +394,46 @@ def mvt_tiles_occurrences(request, zoom, x, y):
     if end_date:
         sql_params["end_date"] = end_date.strftime(DB_DATE_EXCHANGE_FORMAT_PYTHON)
 
+    return _prepare_query(OCCURRENCES_TILE_TEMPLATE, sql_params)
+
+
+def occurrences_tile(zoom: int, x: int, y: int, *filters) -> bytes:
+    """MVT tile with the non-aggregated occurrences, for high zoom levels. Filters are honoured."""
+    return _mvt_query_data(*occurrences_tile_query(zoom, x, y, *filters))
+
+
+@tile_stored(OCCURRENCES_LAYER)
+def mvt_tiles_occurrences(request, zoom, x, y):
+    """Tile server, showing non-aggregated occurrences, for high zoom levels. Filters are honoured."""
     return HttpResponse(
-        _mvt_query_data(sql_template, sql_params),
-        content_type="application/vnd.mapbox-vector-tile",
+        occurrences_tile(zoom, x, y, *filters_from_request(request)),
+        content_type=MVT_CONTENT_TYPE,
     )
 
 
-@cache_page(TILE_SERVER_CACHING_DURATION)
-def mvt_tiles_hex_aggregated_occurrences(request, zoom, x, y):
-    """Tile server, showing occurrences aggregated by hexagon squares. Filters are honoured."""
-    (
-        dataset_id,
-        species_id,
-        start_date,
-        end_date,
-        records_type,
-        area_ids,
-    ) = filters_from_request(request)
-
-    sql_template = readable_string(
-        Template(
-            """
-        WITH grid AS ($jinjasql_fragment_aggregated_hex_grid),
-             mvtgeom AS (SELECT ST_AsMVTGeom(geom, ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})) AS geom, count FROM grid)
-        SELECT st_asmvt(mvtgeom.*) FROM mvtgeom;
-    """
-        ).substitute(
-            jinjasql_fragment_aggregated_hex_grid=JINJASQL_FRAGMENT_AGGREGATED_HEX_GRID
+HEX_AGGREGATED_OCCURRENCES_METATILE_TEMPLATE = _compile_template(
+    readable_string(
+        JINJASQL_METATILE.substitute(
+            grid=JINJASQL_FRAGMENT_AGGREGATED_HEX_GRID, attributes="grid.count"
         )
     )
+)
+
 
+def hex_aggregated_occurrences_metatile_query(
+    zoom: int,
+    x0: int,
+    y0: int,
+    size: int,
+    dataset_id: Optional[int] = None,
+    species_id: Optional[int] = None,
+    start_date: Optional[datetime.date] = None,
+    end_date: Optional[datetime.date] = None,
+    records_type: Optional[str] = None,
+    area_ids: Optional[List[int]] = None,
+) -> Tuple[str, list]:
+    """Query (and bind parameters) of the MVT tiles (of a metatile) with the occurrences aggregated by hexagon
+    squares. Filters are honoured."""
     sql_params = {
         "hex_size_meters": ZOOM_TO_HEX_SIZE[zoom],
         "grid_extent_viewport": True,
@@ -257,8 +442,10 @@ def mvt_tiles_hex_aggregated_occurrences(request, zoom, x, y):
         "area_ids": area_ids,
         "records_type": records_type,
         "zoom": zoom,
-        "x": x,
-        "y": y,
+        "x0": x0,
+        "y0": y0,
+        "x1": x0 + size - 1,
+        "y1": y0 + size - 1,
     }
 
     if start_date:
@@ -266,9 +453,42 @@ def mvt_tiles_hex_aggregated_occurrences(request, zoom, x, y):
     if end_date:
         sql_params["end_date"] = end_date.strftime(DB_DATE_EXCHANGE_FORMAT_PYTHON)
 
+    return _prepare_query(HEX_AGGREGATED_OCCURRENCES_METATILE_TEMPLATE, sql_params)
+
+
+def hex_aggregated_occurrences_metatile(
+    zoom: int, x0: int, y0: int, size: int, *filters, **named_filters
+) -> Dict[Tuple[int, int], bytes]:
+    """MVT tiles (of a metatile) with the occurrences aggregated by hexagon squares. Filters are honoured."""
+    return _mvt_metatile_query_data(
+        *hex_aggregated_occurrences_metatile_query(
+            zoom, x0, y0, size, *filters, **named_filters
+        )
+    )
+
+
+def hex_aggregated_occurrences_tile(zoom: int, x: int, y: int, *filters) -> bytes:
+    """MVT tile with the occurrences aggregated by hexagon squares. Filters are honoured."""
+    return hex_aggregated_occurrences_metatile(zoom, x, y, 1, *filters)[(x, y)]
+
+
+def _hex_aggregated_occurrences_metatile_for_request(
+    request, zoom: int, x0: int, y0: int, size: int
+) -> Dict[Tuple[int, int], bytes]:
+    return hex_aggregated_occurrences_metatile(
+        zoom, x0, y0, size, *filters_from_request(request)
+    )
+
+
+@tile_stored(
+    HEX_AGGREGATED_OCCURRENCES_LAYER,
+    render_metatile=_hex_aggregated_occurrences_metatile_for_request,
+)
+def mvt_tiles_hex_aggregated_occurrences(request, zoom, x, y):
+    """Tile server, showing occurrences aggregated by hexagon squares. Filters are honoured."""
     return HttpResponse(
-        _mvt_query_data(sql_template, sql_params),
-        content_type="application/vnd.mapbox-vector-tile",
+        hex_aggregated_occurrences_tile(zoom, x, y, *filters_from_request(request)),
+        content_type=MVT_CONTENT_TYPE,
     )
 
 
@@ -278,7 +498,7 @@ JINJASQL_FRAGMENT_AGGREGATED_WATER_GRID = Template(
     FROM (
         SELECT mpoly, waterway_length_in_meters
         FROM dashboard_fishnetsquare
-        WHERE mpoly && ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})
+        WHERE mpoly && $metatile_envelope
     ) AS squares
     INNER JOIN (
         $jinjasql_fragment_filter_occurrences
@@ -288,41 +508,44 @@ JINJASQL_FRAGMENT_AGGREGATED_WATER_GRID = Template(
 """
 ).substitute(
     jinjasql_fragment_filter_occurrences=JINJASQL_FRAGMENT_FILTER_OCCURRENCES,
+    metatile_envelope=JINJASQL_FRAGMENT_METATILE_ENVELOPE,
 )
 
 
-@cache_page(TILE_SERVER_CACHING_DURATION)
-def mvt_tiles_occurrences_for_water(request, zoom, x, y):
-    (
-        dataset_id,
-        species_id,
-        start_date,
-        end_date,
-        records_type,
-        area_ids,
-    ) = filters_from_request(request)
-
-    sql_template = readable_string(
-        Template(
-            """
-        WITH 
-            grid AS ($jinjasql_fragment_aggregated_water_grid),
-            mvtgeom AS (SELECT ST_AsMVTGeom(geom, ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})) AS geom, rats_score, water_score FROM grid)
-        SELECT st_asmvt(mvtgeom.*) FROM mvtgeom;
-    """
-        ).substitute(
-            jinjasql_fragment_aggregated_water_grid=JINJASQL_FRAGMENT_AGGREGATED_WATER_GRID
+OCCURRENCES_FOR_WATER_METATILE_TEMPLATE = _compile_template(
+    readable_string(
+        JINJASQL_METATILE.substitute(
+            grid=JINJASQL_FRAGMENT_AGGREGATED_WATER_GRID,
+            attributes="grid.rats_score, grid.water_score",
         )
     )
+)
 
+
+def occurrences_for_water_metatile_query(
+    zoom: int,
+    x0: int,
+    y0: int,
+    size: int,
+    dataset_id: Optional[int] = None,
+    species_id: Optional[int] = None,
+    start_date: Optional[datetime.date] = None,
+    end_date: Optional[datetime.date] = None,
+    records_type: Optional[str] = None,
+    area_ids: Optional[List[int]] = None,
+) -> Tuple[str, list]:
+    """Query (and bind parameters) of the MVT tiles (of a metatile) with the fishnet squares, their occurrences count
+    and waterway length. Filters are honoured."""
     sql_params = {
         "dataset_id": dataset_id,
         "species_id": species_id,
         "area_ids": area_ids,
         "records_type": records_type,
         "zoom": zoom,
-        "x": x,
-        "y": y,
+        "x0": x0,
+        "y0": y0,
+        "x1": x0 + size - 1,
+        "y1": y0 + size - 1,
     }
 
     if start_date:
@@ -330,71 +553,171 @@ def mvt_tiles_occurrences_for_water(request, zoom, x, y):
     if end_date:
         sql_params["end_date"] = end_date.strftime(DB_DATE_EXCHANGE_FORMAT_PYTHON)
 
-    return HttpResponse(
-        _mvt_query_data(sql_template, sql_params),
-        content_type="application/vnd.mapbox-vector-tile",
+    return _prepare_query(OCCURRENCES_FOR_WATER_METATILE_TEMPLATE, sql_params)
+
+
+def occurrences_for_water_metatile(
+    zoom: int, x0: int, y0: int, size: int, *filters, **named_filters
+) -> Dict[Tuple[int, int], bytes]:
+    """MVT tiles (of a metatile) with the fishnet squares, their occurrences count and waterway length. Filters are
+    honoured."""
+    return _mvt_metatile_query_data(
+        *occurrences_for_water_metatile_query(
+            zoom, x0, y0, size, *filters, **named_filters
+        )
     )
 
 
-#@cache_page(TILE_SERVER_CACHING_DURATION)
-def mvt_tiles_areas(request, zoom, x, y):
-    """Tile server, showing MICA areas with biodiversity richness attributes."""
-    years = extract_int_array_request(request, "years[]")
-    species_groups = extract_array_request(request, "speciesGroups[]")
+def occurrences_for_water_tile(zoom: int, x: int, y: int, *filters) -> bytes:
+    """MVT tile with the fishnet squares, their occurrences count and waterway length. Filters are honoured."""
+    return occurrences_for_water_metatile(zoom, x, y, 1, *filters)[(x, y)]
 
-    sql_template = readable_string(
-        """
-        WITH 
-        alleareas AS (
-            SELECT mpoly AS geom, count(*) AS observations_count, count(DISTINCT species.id) AS species_count
-            FROM dashboard_area areas
-            LEFT JOIN dashboard_biodiversityindicatorobservation obs ON
-                st_within(obs.location, areas.mpoly) AND
-                {% if years %} 
-                    EXTRACT('year' FROM obs.date) IN {{ years | inclause }}
+
+def _occurrences_for_water_metatile_for_request(
+    request, zoom: int, x0: int, y0: int, size: int
+) -> Dict[Tuple[int, int], bytes]:
+    return occurrences_for_water_metatile(
+        zoom, x0, y0, size, *filters_from_request(request)
+    )
+
+
+@tile_stored(
+    OCCURRENCES_FOR_WATER_LAYER,
+    render_metatile=_occurrences_for_water_metatile_for_request,
+)
+def mvt_tiles_occurrences_for_water(request, zoom, x, y):
+    return HttpResponse(
+        occurrences_for_water_tile(zoom, x, y, *filters_from_request(request)),
+        content_type=MVT_CONTENT_TYPE,
+    )
+
+
+AREAS_TILE_TEMPLATE = _compile_template(
+    readable_string(
+        Template(
+            """
+        WITH
+        summary AS (
+            SELECT area_id, observations_count, species_ids FROM $summary_table_name
+            WHERE
+                {% if years and species_group_codes %}
+                    year IN {{ years | inclause }} AND species_group IN {{ species_group_codes | inclause }}
                 {% else %}
                     1 = 2
-                {% endif %}    
-            LEFT JOIN dashboard_biodiversityindicatorspecies species
-                ON obs.species_id = species.id AND
-                {% if species_group_codes %}
-                    species_group IN {{ species_group_codes | inclause }}
-                {% else %}
-                    1 = 2    
-                {% endif %}    
+                {% endif %}
+        ),
+        observations AS (
+            SELECT area_id, SUM(observations_count) AS observations_count FROM summary GROUP BY area_id
+        ),
+        species AS (
+            SELECT area_id, COUNT(DISTINCT species_id) AS species_count
+            FROM summary, unnest(species_ids) AS species_id
+            GROUP BY area_id
+        ),
+        area_geometries AS (
+            {% if simplification_band is not none %}
+                SELECT area_id, mpoly FROM $simplified_geometry_table_name
+                WHERE min_zoom = {{ simplification_band }}
+            {% else %}
+                SELECT id AS area_id, mpoly FROM $areas_table_name
+            {% endif %}
+        ),
+        alleareas AS (
+            SELECT
+                areas.mpoly AS geom,
+                COALESCE(observations.observations_count, 0) AS observations_count,
+                COALESCE(species.species_count, 0) AS species_count
+            FROM area_geometries areas
+            LEFT JOIN observations ON observations.area_id = areas.area_id
+            LEFT JOIN species ON species.area_id = areas.area_id
             WHERE
-                mpoly && ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})
-                AND areas.id != 1
-            GROUP BY areas.mpoly), mvtgeom AS (SELECT ST_AsMVTGeom(geom, ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})) AS geom, observations_count, species_count FROM alleareas)
+                areas.mpoly && ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})
+                AND areas.area_id != 1
+        ),
+        mvtgeom AS (
+            SELECT ST_AsMVTGeom(geom, ST_TileEnvelope({{ zoom }}, {{ x }}, {{ y }})) AS geom, observations_count, species_count
+            FROM alleareas
+        )
         SELECT st_asmvt(mvtgeom.*) FROM mvtgeom;
         """
+        ).substitute(
+            summary_table_name=AREA_BIODIVERSITY_SUMMARY_TABLE_NAME,
+            simplified_geometry_table_name=AREA_SIMPLIFIED_GEOMETRY_TABLE_NAME,
+            areas_table_name=AREAS_TABLE_NAME,
+        )
     )
+)
+
 
+def areas_tile_query(
+    zoom: int, x: int, y: int, years: List[int], species_groups: List[str]
+) -> Tuple[str, list]:
+    """Query (and bind parameters) of the MVT tile with the MICA areas and their biodiversity richness attributes.
+
+    Reads the precomputed AreaBiodiversitySummary table: the selected years and species groups are merged by summing
+    the observations counts and counting the distinct species across the per-group species lists. Area geometries are
+    simplified according to the zoom level (AreaSimplifiedGeometry).
+    """
     sql_params = {
         "species_group_codes": species_groups,
         "years": years,
+        "simplification_band": area_simplification_band(zoom),
         "zoom": zoom,
         "x": x,
         "y": y,
     }
 
+    return _prepare_query(AREAS_TILE_TEMPLATE, sql_params)
+
+
+def areas_tile_request_params(request) -> Tuple[List[int], List[str]]:
+    """Return the years and species groups selected in a request to the areas tile server"""
+    return (
+        extract_int_array_request(request, "years[]"),
+        extract_array_request(request, "speciesGroups[]"),
+    )
+
+
+@tile_stored(AREAS_LAYER)
+def mvt_tiles_areas(request, zoom, x, y):
+    """Tile server, showing MICA areas with biodiversity richness attributes (see areas_tile_query())."""
     return HttpResponse(
-        _mvt_query_data(sql_template, sql_params),
-        content_type="application/vnd.mapbox-vector-tile",
+        _mvt_query_data(
+            *areas_tile_query(zoom, x, y, *areas_tile_request_params(request))
+        ),
+        content_type=MVT_CONTENT_TYPE,
     )
 
 
-def _mvt_query_data(sql_template, sql_params):
-    """Return binary data for the SQL query defined by sql_template and sql_params.
+def _prepare_query(template: JinjaTemplate, sql_params) -> Tuple[str, list]:
+    """Render a compiled JinjaSql template (see _compile_template()): return the query and its bind parameters
 
-    Only for queries that returns a binary MVT (i.e. starts with "ST_AsMVT")"""
-    j = JinjaSql()
-    query, bind_params = j.prepare_query(sql_template, sql_params)
+    The text of the query only depends on the "shape" of the parameters (which filters are set, how many areas...), so
+    it can be executed as a prepared statement (see execute_prepared())."""
+    query, bind_params = _JINJASQL.prepare_query(template, sql_params)
+    return query, list(bind_params)
+
+
+def _mvt_query_data(query, bind_params) -> bytes:
+    """Return binary data for the SQL query (see _prepare_query()).
 
+    Only for queries that returns a binary MVT (i.e. starts with "ST_AsMVT")"""
     with connection.cursor() as cursor:
-        cursor.execute(query, bind_params)
+        execute_prepared(cursor, query, bind_params)
         if cursor.rowcount != 0:
             data = cursor.fetchone()[0].tobytes()
         else:
-            data = ""
+            data = b""
         return data
+
+
+def _mvt_metatile_query_data(query, bind_params) -> Dict[Tuple[int, int], bytes]:
+    """Return the MVT data of each tile of a metatile, for the SQL query (see _prepare_query()).
+
+    Only for queries that return (tile x, tile y, MVT) rows (see JINJASQL_METATILE)"""
+    with connection.cursor() as cursor:
+        execute_prepared(cursor, query, bind_params)
+        return {
+            (x, y): data.tobytes() if data is not None else b""
+            for x, y, data in cursor.fetchall()
+        }
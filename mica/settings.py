@@ -112,6 +112,26 @@ CACHES = {
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Persistent store of the rendered map tiles (SQLite file, shared by all processes). Set the path to None to disable.
+TILE_STORE_PATH = os.path.join(BASE_DIR, "tile_store", "tiles.sqlite")
+# Least recently used tiles are evicted above this size
+TILE_STORE_MAX_SIZE_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+# The hexagon and water layers are rendered by blocks ("metatiles") of N x N tiles (power of 2, 1 to disable)
+TILE_METATILE_SIZE = 4
+# Serve the map tiles with async views, their queries going through a pool of async PostgreSQL connections. Requires an
+# ASGI server (e.g. uvicorn mica.asgi:application) and psycopg 3 (optional dependency, see requirements-async.txt)
+ASYNC_TILE_VIEWS = False
+# Size bounds of the connection pool of the async tile views (per process)
+ASYNC_TILE_DB_POOL_MIN_SIZE = 2
+ASYNC_TILE_DB_POOL_MAX_SIZE = 20
+# Execute the tile queries as server-side prepared statements (see dashboard/prepared_statements.py). Only useful with
+# persistent database connections (CONN_MAX_AGE, see settings_local.template.py), and incompatible with a
+# transaction-level connection pooler (e.g. PgBouncer in transaction mode)
+TILE_PREPARED_STATEMENTS = False
+# The occurrences tiles have integer dataset and GBIF ids only (the dashboard looks the dataset names up), instead of the
+# dataset names and textual GBIF ids. After changing this, purge the stored tiles: manage.py tile_store --purge
+OCCURRENCES_TILE_COMPACT_ATTRIBUTES = True
+
 
 GBIF_COUNTRIES_TO_IMPORT = ["BE", "DE", "NL"]
 GBIF_TAXA_IDS_TO_IMPORT = [5219858, 4264680]  # We only import those species
@@ -127,6 +147,14 @@ GBIF_CATCHES_DATASET_KEY = [
 # A (writable by Django) directory where GBIF datasets are temporarily stored before their ingestion
 DATASET_TEMPORARY_DIR = os.path.join(BASE_DIR, "initial_datasets_temp")
 
+GBIF_API_URL = "https://api.gbif.org/v1"
+GBIF_API_MAX_CONCURRENT_REQUESTS = 8
+# Persistent cache of the dataset names retrieved from the GBIF API
+GBIF_DATASET_NAMES_CACHE_PATH = os.path.join(
+    DATASET_TEMPORARY_DIR, "gbif_dataset_names.json"
+)
+GBIF_DATASET_NAMES_CACHE_TTL = 60 * 60 * 24 * 30  # 30 days
+
 # LOGGING = {
 #     "version": 1,
 #     "filters": {
@@ -20,8 +20,12 @@ DATABASES = {
         "PASSWORD": "postgis",
         "HOST": "db",
         "PORT": 5432,
+        # Persistent connections (seconds), so that the prepared tile queries are reused (see TILE_PREPARED_STATEMENTS)
+        "CONN_MAX_AGE": 600,
     }
 }
+# Prepared statements only pay off with persistent connections
+TILE_PREPARED_STATEMENTS = bool(DATABASES["default"].get("CONN_MAX_AGE"))
 
 ALLOWED_HOSTS = ["localhost"]
 
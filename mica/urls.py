@@ -13,10 +13,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
 from dashboard import views
+from dashboard.views import async_tileserver
+
+# Views of the map tiles: async views (under an ASGI server) or the regular ones
+tile_views = async_tileserver if settings.ASYNC_TILE_VIEWS else views
 
 urlpatterns = [
     path("", views.index, name="dashboard-index"),
@@ -63,22 +68,22 @@ urlpatterns = [
     path("api/area/<int:id>", views.area_geojson, name="dashboard-api-area-geojson"),
     path(
         "api/tiles/<int:zoom>/<int:x>/<int:y>.mvt",
-        views.mvt_tiles_occurrences,
+        tile_views.mvt_tiles_occurrences,
         name="dashboard-api-mvt-tiles-occurrences-simple",
     ),
     path(
         "api/tiles_hex_aggregated/<int:zoom>/<int:x>/<int:y>.mvt",
-        views.mvt_tiles_hex_aggregated_occurrences,
+        tile_views.mvt_tiles_hex_aggregated_occurrences,
         name="dashboard-api-mvt-tiles-occurrences-hex",
     ),
     path(
         "api/tiles_occurrences_for_water/<int:zoom>/<int:x>/<int:y>.mvt",
-        views.mvt_tiles_occurrences_for_water,
+        tile_views.mvt_tiles_occurrences_for_water,
         name="dashboard-api-mvt-tiles-occurrences-water",
     ),
     path(
         "api/tiles_areas/<int:zoom>/<int:x>/<int:y>.mvt",
-        views.mvt_tiles_areas,
+        tile_views.mvt_tiles_areas,
         name="dashboard-api-mvt-tiles-areas",
     ),
     path(